@@ -0,0 +1,205 @@
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional
+from config import Config
+from metrics import metrics
+from cancellation import CancellationToken, RunCancelledError, current_cancel_token
+
+# Session the current call is made on behalf of; set by CreditScoreChain.process_message
+current_session_id: ContextVar[Optional[str]] = ContextVar("current_session_id", default=None)
+
+class OverloadedError(Exception):
+    """Raised when a call is shed because concurrency, queue or rate limits are exhausted"""
+
+def _raise_if_cancelled():
+    """Stop waiting once the agent run the call belongs to is cancelled"""
+    token = current_cancel_token.get()
+    if token is not None:
+        token.raise_if_cancelled()
+
+class TokenBucket:
+    """Token-bucket rate limiter: `rate` tokens per second, bursts up to `capacity`"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = max(capacity, 1.0)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, timeout: float = 0.0) -> bool:
+        """
+        Take one token, waiting up to timeout seconds for it
+
+        Returns:
+            True if a token was taken, False if none became available in time
+
+        Raises:
+            RunCancelledError: If the current agent run is cancelled while waiting
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                wait = (1 - self._tokens) / self.rate
+            if now + wait > deadline:
+                return False
+            time.sleep(min(wait, CancellationToken.POLL_INTERVAL))
+            _raise_if_cancelled()
+
+class AdmissionController:
+    """
+    Bounds concurrent calls to a downstream service
+
+    Calls beyond the global or per-session limit wait in a bounded queue; once the
+    queue is full, or a call has waited queue_timeout seconds, it is rejected with
+    OverloadedError instead of piling up until the downstream timeout. A limit of 0
+    disables that check.
+    """
+
+    def __init__(self, name: str, max_concurrent: int = 0, max_per_session: int = 0,
+                 max_queue: int = 0, queue_timeout: float = 10.0,
+                 rate: float = 0.0, burst: float = 0.0):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_per_session = max_per_session
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.bucket = TokenBucket(rate, burst or rate) if rate > 0 else None
+        # Performance profile the limits were taken from (set by the getters below)
+        self.profile = None
+
+        self._cond = threading.Condition()
+        self._active = 0
+        self._waiting = 0
+        self._per_session: Dict[str, int] = {}
+
+    def _has_slot(self, session_id: Optional[str]) -> bool:
+        if self.max_concurrent and self._active >= self.max_concurrent:
+            return False
+        if session_id and self.max_per_session and self._per_session.get(session_id, 0) >= self.max_per_session:
+            return False
+        return True
+
+    def _reject(self, reason: str):
+        metrics.increment(f"admission.{self.name}.rejected")
+        raise OverloadedError(f"The {self.name} service is busy ({reason}). Please try again shortly.")
+
+    def enter(self, session_id: Optional[str] = None, blocking: bool = True) -> Optional[str]:
+        """
+        Admit one call, waiting in the queue if needed
+
+        Args:
+            session_id: Session the call belongs to (defaults to current_session_id)
+            blocking: If False, reject immediately instead of queueing
+
+        Returns:
+            The session_id to pass to leave()
+
+        Raises:
+            OverloadedError: If the call was shed
+            RunCancelledError: If the current agent run is cancelled while queued
+        """
+        if session_id is None:
+            session_id = current_session_id.get()
+        start = time.monotonic()
+        deadline = start + self.queue_timeout
+
+        with self._cond:
+            if not self._has_slot(session_id):
+                if not blocking:
+                    self._reject("no free slot")
+                if self.max_queue and self._waiting >= self.max_queue:
+                    self._reject("queue full")
+                self._waiting += 1
+                try:
+                    while not self._has_slot(session_id):
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            self._reject("timed out in queue")
+                        self._cond.wait(min(remaining, CancellationToken.POLL_INTERVAL))
+                        _raise_if_cancelled()
+                finally:
+                    self._waiting -= 1
+            self._active += 1
+            if session_id:
+                self._per_session[session_id] = self._per_session.get(session_id, 0) + 1
+
+        if self.bucket is not None:
+            timeout = max(0.0, deadline - time.monotonic()) if blocking else 0.0
+            try:
+                acquired = self.bucket.acquire(timeout)
+            except RunCancelledError:
+                self.leave(session_id)
+                raise
+            if not acquired:
+                self.leave(session_id)
+                self._reject("rate limit reached")
+
+        metrics.observe(f"admission.{self.name}.queue_wait_ms", (time.monotonic() - start) * 1000)
+        return session_id
+
+    def leave(self, session_id: Optional[str] = None):
+        """Release a slot taken by enter()"""
+        with self._cond:
+            self._active -= 1
+            if session_id:
+                remaining = self._per_session.get(session_id, 0) - 1
+                if remaining > 0:
+                    self._per_session[session_id] = remaining
+                else:
+                    self._per_session.pop(session_id, None)
+            self._cond.notify_all()
+
+    @contextmanager
+    def acquire(self, session_id: Optional[str] = None, blocking: bool = True):
+        """Context manager around enter() / leave()"""
+        session_id = self.enter(session_id, blocking)
+        try:
+            yield
+        finally:
+            self.leave(session_id)
+
+# Global admission controllers, rebuilt when another performance profile is applied;
+# calls admitted by a replaced controller still leave through it
+_backend_admission = None
+_llm_admission = None
+
+def get_backend_admission() -> AdmissionController:
+    """Get or create the admission controller for credit-score backend calls"""
+    global _backend_admission
+    if _backend_admission is None or _backend_admission.profile is not Config.PERF_PROFILE:
+        _backend_admission = AdmissionController(
+            "backend",
+            max_concurrent=Config.BACKEND_MAX_CONCURRENT,
+            max_per_session=Config.BACKEND_MAX_PER_SESSION,
+            max_queue=Config.BACKEND_MAX_QUEUE,
+            queue_timeout=Config.ADMISSION_QUEUE_TIMEOUT_SECONDS,
+            rate=Config.BACKEND_RATE_LIMIT,
+            burst=Config.BACKEND_RATE_BURST
+        )
+        _backend_admission.profile = Config.PERF_PROFILE
+    return _backend_admission
+
+def get_llm_admission() -> AdmissionController:
+    """Get or create the admission controller for OpenAI calls"""
+    global _llm_admission
+    if _llm_admission is None or _llm_admission.profile is not Config.PERF_PROFILE:
+        _llm_admission = AdmissionController(
+            "llm",
+            max_concurrent=Config.LLM_MAX_CONCURRENT,
+            max_per_session=Config.LLM_MAX_PER_SESSION,
+            max_queue=Config.LLM_MAX_QUEUE,
+            queue_timeout=Config.ADMISSION_QUEUE_TIMEOUT_SECONDS,
+            rate=Config.LLM_RATE_LIMIT,
+            burst=Config.LLM_RATE_BURST
+        )
+        _llm_admission.profile = Config.PERF_PROFILE
+    return _llm_admission
@@ -1,122 +1,369 @@
+import json
+import time
+import uuid
+from typing import Optional, Tuple
 from langchain_openai import ChatOpenAI
-from langchain.agents import AgentExecutor, create_openai_tools_agent
+from langchain.agents import AgentExecutor
+from langchain.agents.format_scratchpad.openai_tools import format_to_openai_tool_messages
+from langchain.agents.output_parsers.openai_tools import OpenAIToolsAgentOutputParser
 from langchain.memory import ConversationBufferMemory
-from langchain.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain.schema import SystemMessage
+from langchain_core.messages import AIMessage, ToolMessage
+from langchain_core.runnables import RunnableLambda, RunnablePassthrough
 from config import Config
-from ai.tools import SearchCustomerTool, GetCreditScoreTool, CompanySelectionTool
+from metrics import metrics
+from admission import OverloadedError, current_session_id, get_llm_admission
+from background import get_background_loop
+from cancellation import CancellationToken, RunCancelledError, current_cancel_token
+import tracing
+from profiling import get_profiler
+from ai.prompts import get_agent_prompt, get_openai_tools, get_prompt_prefix_fingerprint
+from api.models import SearchHit
+from ai.tools import SearchCustomerTool, GetCreditScoreTool
+
+# Chat model clients (and their HTTP connection pools) shared by every session,
+# for the performance profile they were created with
+_chat_models = {}
+_chat_models_profile = None
+# Extra ChatOpenAI arguments for every tier, e.g. http_async_client (see reset_chat_models)
+_chat_model_options = {}
+
+def get_chat_model(tier: str):
+    """
+    Get or create the shared ChatOpenAI client for a model tier
+    
+    Args:
+        tier: "large" (OPENAI_MODEL) or "fast" (OPENAI_FAST_MODEL)
+        
+    Returns:
+        The ChatOpenAI instance, or None for "fast" when model routing is disabled
+    """
+    global _chat_models_profile
+    if _chat_models_profile is not Config.PERF_PROFILE:
+        _chat_models.clear()
+        _chat_models_profile = Config.PERF_PROFILE
+    if tier not in _chat_models:
+        if tier == "fast":
+            if Config.OPENAI_FAST_MODEL and Config.OPENAI_FAST_MODEL != Config.OPENAI_MODEL:
+                _chat_models[tier] = ChatOpenAI(
+                    model=Config.OPENAI_FAST_MODEL,
+                    temperature=Config.OPENAI_TEMPERATURE,
+                    max_tokens=Config.OPENAI_FAST_MAX_TOKENS,
+                    api_key=Config.OPENAI_API_KEY,
+                    **_chat_model_options
+                )
+            else:
+                _chat_models[tier] = None
+        else:
+            _chat_models[tier] = ChatOpenAI(
+                model=Config.OPENAI_MODEL,
+                temperature=Config.OPENAI_TEMPERATURE,
+                api_key=Config.OPENAI_API_KEY,
+                **_chat_model_options
+            )
+    return _chat_models[tier]
+
+def reset_chat_models(**options):
+    """
+    Drop the shared chat model clients; chains created afterwards get new ones
+    
+    Args:
+        **options: Extra ChatOpenAI arguments for the new clients, e.g.
+            http_async_client to send requests through a replaying transport
+    """
+    _chat_models.clear()
+    _chat_model_options.clear()
+    _chat_model_options.update(options)
 
 class CreditScoreChain:
     """LangChain setup for the credit score chatbot"""
     
     def __init__(self):
-        self.llm = ChatOpenAI(
-            model=Config.OPENAI_MODEL,
-            temperature=0.1,
-            api_key=Config.OPENAI_API_KEY
-        )
+        # Identifies this conversation for per-session concurrency limits
+        self.session_id = uuid.uuid4().hex
         
-        # Initialize tools with proper error handling
+        # Initialize tools with proper error handling; choosing between several
+        # matches happens in the UI (see get_company_choices), not through the agent
         try:
-            self.tools = [
-                SearchCustomerTool(),
-                GetCreditScoreTool(),
-                CompanySelectionTool()
-            ]
+            self.search_tool = SearchCustomerTool()
+            self.credit_score_tool = GetCreditScoreTool(search_tool=self.search_tool)
+            self.tools = [self.search_tool, self.credit_score_tool]
         except Exception as e:
             print(f"Error initializing tools: {e}")
+            self.search_tool = None
+            self.credit_score_tool = None
             self.tools = []
         
-        # Initialize memory
+        # Initialize memory (trimmed to MAX_CONVERSATION_HISTORY messages after each turn)
         self.memory = ConversationBufferMemory(
             memory_key="chat_history",
-            return_messages=True,
-            max_token_limit=Config.MAX_CONVERSATION_HISTORY * 100  # Approximate tokens
+            return_messages=True
         )
         
+        # Token usage of the current (or last) process_message call
+        self.turn_usage = {"prompt_tokens": 0, "cached_prompt_tokens": 0}
+        
+        # Cancellation token of the run in progress, if any
+        self.active_run: Optional[CancellationToken] = None
+        
         # Create the agent
+        self._build_agent()
+    
+    def _build_agent(self):
+        """Create the models and agent for the active performance profile"""
+        self.profile = Config.PERF_PROFILE
+        
+        # Large model for final answers; small, fast model for planning and tool calls
+        self.llm = get_chat_model("large")
+        self.fast_llm = get_chat_model("fast")
+        
         try:
             self.agent = self._create_agent()
             self.agent_executor = AgentExecutor(
                 agent=self.agent,
                 tools=self.tools,
                 memory=self.memory,
-                verbose=True,
+                verbose=Config.AGENT_VERBOSE,
                 handle_parsing_errors=True,
-                max_iterations=5
+                max_iterations=Config.AGENT_MAX_ITERATIONS
             )
         except Exception as e:
             print(f"Error creating agent: {e}")
             self.agent_executor = None
     
     def _create_agent(self):
-        """Create the OpenAI tools agent"""
+        """Create the OpenAI tools agent from the shared, precompiled prompt and tool schemas"""
+        prompt = get_agent_prompt()
+        openai_tools = get_openai_tools(self.tools)
+        self.tool_names = {tool.name for tool in self.tools}
+        # Identifies the cacheable prefix on LLM spans and in the sidebar; a change
+        # between deployments explains a drop in cached prompt tokens
+        self.prompt_prefix = get_prompt_prefix_fingerprint(self.tools)
+        self.llm_with_tools = self.llm.bind(tools=openai_tools)
+        self.fast_llm_with_tools = self.fast_llm.bind(tools=openai_tools) if self.fast_llm else None
         
-        # System prompt from prompt-ai.txt
-        system_prompt = """You are a professional Credit Score AI Assistant designed to help users find and analyze credit scores for companies. You have access to specialized tools and APIs to provide accurate, real-time credit information.
-
-## Your Core Responsibilities:
-
-1. **Customer Search & Matching**: When users ask for a company's credit score, you will:
-   - Search for the company using fuzzy matching via the search_customer tool
-   - Analyze search results to identify the best match
-   - Handle cases where multiple companies have similar names
-   - Provide clear options when exact matches aren't found
-
-2. **Credit Score Analysis**: Once a customer is identified, you will:
-   - Retrieve comprehensive credit information using the get_credit_score tool
-   - Present credit scores in an easy-to-understand format
-   - Provide context about what the scores mean
-   - Highlight any risk factors or positive indicators
-
-3. **Professional Communication**: Always maintain:
-   - Professional, courteous tone
-   - Clear explanations of credit terminology
-   - Helpful guidance for users
-   - Compliance with financial data regulations
-
-## Available Tools:
-- search_customer: Search for customers/companies by name
-- get_credit_score: Get detailed credit score information for a customer ID
-- select_company: Help users select from multiple search results
-
-## Response Guidelines:
-- Be Helpful: Always try to find the most relevant information
-- Be Clear: Explain credit scores and what they mean
-- Be Accurate: Only provide information you can verify through the tools
-- Be Professional: Maintain confidentiality and professional standards
-- Be Informative: Provide context and explanations when appropriate
-
-## Error Handling:
-- If no companies are found, suggest alternative search terms
-- If the API is unavailable, inform the user and suggest trying again later
-- If there are multiple matches, clearly present the options
-- Always be transparent about what information is available vs. what isn't
-
-Remember: You are a financial data assistant. Always be professional, accurate, and helpful while respecting the sensitive nature of credit information."""
-
-        prompt = ChatPromptTemplate.from_messages([
-            SystemMessage(content=system_prompt),
-            MessagesPlaceholder(variable_name="chat_history"),
-            ("human", "{input}"),
-            MessagesPlaceholder(variable_name="agent_scratchpad"),
-        ])
+        # Same layout as create_openai_tools_agent, with model routing in place of a single LLM
+        return (
+            RunnablePassthrough.assign(
+                agent_scratchpad=lambda x: format_to_openai_tool_messages(x["intermediate_steps"])
+            )
+            | prompt
+            | RunnableLambda(self._route_llm)
+            | OpenAIToolsAgentOutputParser()
+        )
+    
+    def _route_llm(self, prompt_value, config):
+        """
+        Send one agent iteration to the cheapest model tier that handles it
+        
+        The fast tier answers first. Its output is used when it is a valid tool call;
+        a final answer (or anything that does not validate) is regenerated by the
+        large model so the narrative analysis always comes from OPENAI_MODEL. The step
+        after a credit score result is the final answer, so it goes to the large
+        model directly.
+        """
+        messages = prompt_value.to_messages()
+        if self.fast_llm_with_tools is None or self._follows_credit_score(messages):
+            return self._invoke_llm("large", self.llm_with_tools, messages, config)
+        
+        message = self._invoke_llm("fast", self.fast_llm_with_tools, messages, config)
+        if self._is_valid_tool_step(message):
+            return message
         
-        return create_openai_tools_agent(self.llm, self.tools, prompt)
+        metrics.increment("llm.escalations")
+        return self._invoke_llm("large", self.llm_with_tools, messages, config)
+    
+    def _invoke_llm(self, tier: str, llm, messages, config=None):
+        """
+        Invoke one model tier and record its latency and token usage
+        
+        The call runs on the background loop so that cancelling the run cancels the
+        in-flight OpenAI request instead of waiting for it to finish.
+        """
+        token = current_cancel_token.get()
+        if token is not None:
+            token.raise_if_cancelled()
+        
+        model = Config.OPENAI_FAST_MODEL if tier == "fast" else Config.OPENAI_MODEL
+        with tracing.span(f"llm {tier}", model=model, prompt_prefix=self.prompt_prefix) as llm_span:
+            with get_llm_admission().acquire(self.session_id):
+                start = time.perf_counter()
+                future = get_background_loop().submit(llm.ainvoke(messages, config=config))
+                message = token.wait(future) if token is not None else future.result()
+            metrics.observe(f"llm.{tier}.latency_ms", (time.perf_counter() - start) * 1000)
+            
+            token_usage = message.response_metadata.get("token_usage") or {}
+            llm_span.set_attribute("prompt_tokens", token_usage.get("prompt_tokens", 0))
+            llm_span.set_attribute("completion_tokens", token_usage.get("completion_tokens", 0))
+        metrics.increment(f"llm.{tier}.calls")
+        metrics.increment(f"llm.{tier}.prompt_tokens", token_usage.get("prompt_tokens", 0))
+        metrics.increment(f"llm.{tier}.completion_tokens", token_usage.get("completion_tokens", 0))
+        
+        cached_tokens = (token_usage.get("prompt_tokens_details") or {}).get("cached_tokens") or 0
+        metrics.increment(f"llm.{tier}.cached_prompt_tokens", cached_tokens)
+        self.turn_usage["prompt_tokens"] += token_usage.get("prompt_tokens", 0)
+        self.turn_usage["cached_prompt_tokens"] += cached_tokens
+        return message
+    
+    def _follows_credit_score(self, messages) -> bool:
+        """Check whether the prompt ends with the result of a get_credit_score call"""
+        if self.credit_score_tool is None:
+            return False
+        tool_call_ids = set()
+        for message in reversed(messages):
+            if isinstance(message, ToolMessage):
+                tool_call_ids.add(message.tool_call_id)
+            elif isinstance(message, AIMessage):
+                return any(
+                    tool_call["id"] in tool_call_ids and tool_call["name"] == self.credit_score_tool.name
+                    for tool_call in message.tool_calls
+                )
+            else:
+                return False
+        return False
+    
+    def _is_valid_tool_step(self, message) -> bool:
+        """Check that a fast-tier message is a complete, well-formed call to known tools"""
+        if message.response_metadata.get("finish_reason") == "length":
+            return False
+        
+        tool_calls = message.additional_kwargs.get("tool_calls") or []
+        if not tool_calls:
+            return False
+        
+        for tool_call in tool_calls:
+            function = tool_call.get("function") or {}
+            if function.get("name") not in self.tool_names:
+                return False
+            try:
+                arguments = json.loads(function.get("arguments") or "{}")
+            except (TypeError, ValueError):
+                return False
+            if not isinstance(arguments, dict):
+                return False
+        return True
     
     def process_message(self, user_message: str) -> str:
         """Process a user message and return the response"""
         try:
+            # Pick up a reloaded performance profile (models, iteration limit)
+            if self.profile is not Config.PERF_PROFILE:
+                self._build_agent()
             if self.agent_executor is None:
                 return "I apologize, but the AI system is not properly initialized. Please check the configuration and try again."
             
-            response = self.agent_executor.invoke({"input": user_message})
+            self.turn_usage = {"prompt_tokens": 0, "cached_prompt_tokens": 0}
+            if self.search_tool is not None:
+                self.search_tool.last_result = None
+            run_token = CancellationToken()
+            self.active_run = run_token
+            session_token = current_session_id.set(self.session_id)
+            cancel_token = current_cancel_token.set(run_token)
+            try:
+                with tracing.span("process_message", session_id=self.session_id), \
+                        get_profiler().maybe_profile(self.session_id):
+                    response = self.agent_executor.invoke({"input": user_message})
+            finally:
+                current_cancel_token.reset(cancel_token)
+                current_session_id.reset(session_token)
+                if self.active_run is run_token:
+                    self.active_run = None
+                self._trim_memory()
+            metrics.observe("llm.prompt_tokens_per_request", self.turn_usage["prompt_tokens"])
+            metrics.observe("llm.cached_prompt_tokens_per_request", self.turn_usage["cached_prompt_tokens"])
             return response.get("output", "I apologize, but I encountered an error processing your request.")
+        except OverloadedError:
+            return "I'm handling too many requests right now. Please try again in a moment."
+        except RunCancelledError:
+            metrics.increment("runs.cancelled")
+            return "Request cancelled."
         except Exception as e:
             return f"I apologize, but I encountered an error: {str(e)}. Please try again."
     
+    def cancel_active_run(self, reason: str = "") -> bool:
+        """
+        Cancel the process_message call in progress, if any
+        
+        Pending LLM and backend requests of the run are cancelled and the run stops
+        before its next step.
+        
+        Returns:
+            True if a run was cancelled
+        """
+        run_token = self.active_run
+        if run_token is None or run_token.cancelled:
+            return False
+        run_token.cancel(reason)
+        return True
+    
+    def get_company_choices(self) -> Tuple[SearchHit, ...]:
+        """
+        Matches of the last turn's search, when the user still has to pick one
+        
+        Returns:
+            The top SEARCH_TOP_K hits if the last search found several companies,
+            otherwise an empty tuple
+        """
+        result = self.search_tool.last_result if self.search_tool is not None else None
+        if result is None or result.error or (len(result.hits) < 2 and not result.truncated):
+            return ()
+        return result.hits[:Config.SEARCH_TOP_K]
+    
+    def get_viewed_accounts(self) -> Tuple[str, ...]:
+        """Accounts whose credit reports this conversation has shown, oldest first"""
+        if self.credit_score_tool is None:
+            return ()
+        return tuple(self.credit_score_tool.served_accounts)
+    
+    def select_company(self, account_no: str) -> str:
+        """
+        Fetch the credit score of a company picked from get_company_choices
+        
+        Calls the backend directly instead of running the agent, and records the
+        exchange in the conversation memory so follow-up questions can refer to it.
+        
+        Args:
+            account_no: Account number of the selected company
+            
+        Returns:
+            The formatted credit score report
+        """
+        hit = next((hit for hit in self.get_company_choices() if hit.account_no == account_no), None)
+        company = hit.varname if hit is not None and hit.varname else account_no
+        try:
+            with tracing.span("select_company", session_id=self.session_id, account_no=account_no):
+                session_token = current_session_id.set(self.session_id)
+                try:
+                    report = self.credit_score_tool.fetch_report(account_no)
+                finally:
+                    current_session_id.reset(session_token)
+                response = self.credit_score_tool._format_credit_score_result(report)
+        except OverloadedError:
+            return "I'm handling too many requests right now. Please try again in a moment."
+        except Exception as e:
+            return f"Error getting credit score for customer ID '{account_no}': {str(e)}"
+        
+        metrics.increment("selection.direct")
+        self.search_tool.last_result = None
+        if self.memory:
+            self.memory.save_context(
+                {"input": f"Get the credit score of {company} (Account: {account_no})"},
+                {"output": response}
+            )
+            self._trim_memory()
+        return response
+    
+    def _trim_memory(self):
+        """Keep the conversation history within MAX_CONVERSATION_HISTORY messages"""
+        if self.memory:
+            messages = self.memory.chat_memory.messages
+            excess = len(messages) - Config.MAX_CONVERSATION_HISTORY
+            if excess > 0:
+                del messages[:excess]
+    
     def clear_memory(self):
         """Clear the conversation memory"""
+        if self.search_tool is not None:
+            self.search_tool.last_result = None
         if self.memory:
             self.memory.clear()
     
@@ -0,0 +1,100 @@
+import json
+import os
+import re
+from typing import Any, Dict, List, Optional
+from api.models import CreditReport
+
+CATALOG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "interpretation_catalog.json")
+
+# Loaded once per process
+_catalog = None
+# Matches any band label in a report description, longest label first
+_band_label_pattern = None
+
+def get_catalog() -> Dict[str, Any]:
+    """Get the interpretation catalog (score bands, risk levels, component and flag notes)"""
+    global _catalog, _band_label_pattern
+    if _catalog is None:
+        with open(CATALOG_PATH, encoding="utf-8") as f:
+            catalog = json.load(f)
+        catalog["score_bands"] = sorted(catalog.get("score_bands", []), key=lambda band: band["min"], reverse=True)
+        labels = sorted((band["label"] for band in catalog["score_bands"]), key=len, reverse=True)
+        _band_label_pattern = re.compile(r"\b(" + "|".join(re.escape(label) for label in labels) + r")\b", re.IGNORECASE)
+        _catalog = catalog
+    return _catalog
+
+def _normalize_key(key: str) -> str:
+    return str(key).strip().lower().replace(" ", "_").replace("-", "_")
+
+def _is_set(value: Any) -> bool:
+    """A flag counts as raised unless it is explicitly false, zero or empty"""
+    if isinstance(value, str):
+        return value.strip().lower() not in ("", "0", "false", "no", "none", "n")
+    return bool(value)
+
+def _band_agrees(band: Dict[str, Any], report: CreditReport) -> bool:
+    """
+    Check a catalog band against the backend's own assessment of the report
+
+    The catalog's thresholds are generic; a band is only shown when the report's
+    risk level is one the band allows and its description names no other band.
+    """
+    risk_level = report.risk_level.strip().lower()
+    if risk_level and risk_level not in band.get("risk_levels", [risk_level]):
+        return False
+
+    # The band came from get_score_band, so the catalog and pattern are loaded
+    match = _band_label_pattern.search(report.description) if report.description else None
+    return match is None or match.group(1).lower() == band["label"].lower()
+
+def get_score_band(score: Optional[float]) -> Optional[Dict[str, Any]]:
+    """Get the catalog band a score falls in, with its "range" (e.g. "670-739") added"""
+    if score is None:
+        return None
+    upper = None
+    for band in get_catalog()["score_bands"]:
+        if score >= band["min"]:
+            score_range = f"{band['min']}-{upper}" if upper is not None else f"{band['min']}+"
+            return {**band, "range": score_range}
+        upper = band["min"] - 1
+    return None
+
+def interpret_report(report: CreditReport) -> List[str]:
+    """
+    Get the precomputed explanation snippets that apply to a credit report
+
+    Returns:
+        One line per matching score band (unless it contradicts the report), risk
+        level, component and raised flag
+    """
+    catalog = get_catalog()
+    snippets = []
+
+    band = get_score_band(report.credit_score)
+    if band is not None and _band_agrees(band, report):
+        snippets.append(f"Score band {band['label']} ({band['range']}): {band['text']}")
+
+    risk_text = catalog.get("risk_levels", {}).get(report.risk_level.strip().lower())
+    if risk_text:
+        snippets.append(risk_text)
+
+    components = catalog.get("components", {})
+    for key, _ in report.components:
+        text = components.get(_normalize_key(key))
+        if text:
+            snippets.append(text)
+
+    flags = catalog.get("flags", {})
+    for key, value in report.flags:
+        text = flags.get(_normalize_key(key))
+        if text and _is_set(value):
+            snippets.append(text)
+
+    return snippets
+
+def format_interpretation(report: CreditReport) -> str:
+    """Format the interpretation snippets as a tool-output section, or "" if none apply"""
+    snippets = interpret_report(report)
+    if not snippets:
+        return ""
+    return "\n".join([f"Interpretation (catalog v{get_catalog().get('version', '?')}):", *[f"- {snippet}" for snippet in snippets]])
@@ -0,0 +1,96 @@
+import hashlib
+import json
+from typing import List, Dict, Any
+from langchain.prompts import ChatPromptTemplate, MessagesPlaceholder
+from langchain.schema import SystemMessage
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+# System prompt from prompt-ai.txt
+#
+# Keep this free of per-request content (dates, user names, session data): together
+# with the tool schemas it forms the byte-identical prefix that OpenAI's prompt
+# caching can reuse across every session.
+SYSTEM_PROMPT = """You are a professional Credit Score AI Assistant designed to help users find and analyze credit scores for companies. You have access to specialized tools and APIs to provide accurate, real-time credit information.
+
+## Your Core Responsibilities:
+
+1. **Customer Search & Matching**: When users ask for a company's credit score, you will:
+   - Search for the company using fuzzy matching via the search_customer tool
+   - Analyze search results to identify the best match
+   - Handle cases where multiple companies have similar names
+   - When several companies match, list them briefly and stop; the user picks one from the options shown under your reply, so do not ask follow-up questions or call get_credit_score until they do
+
+2. **Credit Score Analysis**: Once a customer is identified, you will:
+   - Retrieve comprehensive credit information using the get_credit_score tool
+   - Present credit scores in an easy-to-understand format
+   - Provide context about what the scores mean, using the Interpretation section of the tool output
+   - Highlight any risk factors or positive indicators
+
+3. **Professional Communication**: Always maintain:
+   - Professional, courteous tone
+   - Clear explanations of credit terminology
+   - Helpful guidance for users
+   - Compliance with financial data regulations
+
+## Available Tools:
+- search_customer: Search for customers/companies by name
+- get_credit_score: Get detailed credit score information for a customer ID
+
+## Response Guidelines:
+- Be Helpful: Always try to find the most relevant information
+- Be Clear: Explain credit scores and what they mean
+- Be Accurate: Only provide information you can verify through the tools
+- Be Professional: Maintain confidentiality and professional standards
+- Be Informative: Provide context and explanations when appropriate
+- Be Concise: get_credit_score already includes standard explanations of the score band, risk level, components and flags under "Interpretation"; quote or summarize those lines instead of writing your own explanations
+
+## Error Handling:
+- search_customer already searches common spellings of the name (with and without บริษัท/จำกัด, Co., Ltd., tone marks), so do not retry those; if no companies are found, suggest alternative search terms
+- If the API is unavailable, inform the user and suggest trying again later
+- If there are multiple matches, clearly present the options
+- Always be transparent about what information is available vs. what isn't
+
+Remember: You are a financial data assistant. Always be professional, accurate, and helpful while respecting the sensitive nature of credit information."""
+
+# Compiled once per process and shared by every CreditScoreChain
+_agent_prompt = None
+_openai_tools: Dict[tuple, List[Dict[str, Any]]] = {}
+
+def get_agent_prompt() -> ChatPromptTemplate:
+    """
+    Get the shared agent prompt
+    
+    The static system prompt comes first; everything that varies per request
+    (chat history, user input, tool scratchpad) is placed after it.
+    """
+    global _agent_prompt
+    if _agent_prompt is None:
+        _agent_prompt = ChatPromptTemplate.from_messages([
+            SystemMessage(content=SYSTEM_PROMPT),
+            MessagesPlaceholder(variable_name="chat_history"),
+            ("human", "{input}"),
+            MessagesPlaceholder(variable_name="agent_scratchpad"),
+        ])
+    return _agent_prompt
+
+def get_openai_tools(tools) -> List[Dict[str, Any]]:
+    """
+    Get the OpenAI tool schemas for a list of tools, converted once per process
+    
+    Tools are keyed by name in their given order, so every session sends the
+    same schema objects serialized in the same order.
+    """
+    key = tuple(tool.name for tool in tools)
+    if key not in _openai_tools:
+        _openai_tools[key] = [convert_to_openai_tool(tool) for tool in tools]
+    return _openai_tools[key]
+
+def get_prompt_prefix_fingerprint(tools) -> str:
+    """Short hash of the static prompt prefix, useful for checking that it stays stable"""
+    prefix = json.dumps(
+        {"tools": get_openai_tools(tools), "system": SYSTEM_PROMPT},
+        ensure_ascii=False,
+        sort_keys=True,
+        separators=(",", ":")
+    )
+    return hashlib.sha256(prefix.encode("utf-8")).hexdigest()[:12]
@@ -1,7 +1,11 @@
 from langchain.tools import BaseTool
-from typing import Dict, Any, List, Optional
-import asyncio
+from typing import List, Optional
+from config import Config
 from api.client import CreditScoreAPIClient
+from api.models import SearchHit, SearchResult, CreditReport
+from ai.interpretation import format_interpretation
+from cancellation import RunCancelledError
+import tracing
 
 # Global API client instance
 _api_client = None
@@ -13,119 +17,136 @@ def get_api_client():
         _api_client = CreditScoreAPIClient()
     return _api_client
 
+def set_api_client(api_client: Optional[CreditScoreAPIClient]):
+    """Replace the shared API client (None creates a new default one on next use)"""
+    global _api_client
+    _api_client = api_client
+
 class SearchCustomerTool(BaseTool):
     """Tool for searching customers by name"""
     
     name: str = "search_customer"
     description: str = "Search for customers/companies by name using fuzzy matching. Use this when a user asks for a company's credit score but you need to find the company first."
+    # Most recent result, so the UI can offer its matches as choices
+    last_result: Optional[SearchResult] = None
     
     def _run(self, name: str) -> str:
         """Run the tool synchronously"""
         try:
-            api_client = get_api_client()
-            # Run async function in sync context
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            result = loop.run_until_complete(api_client.search_customer(name))
-            loop.close()
-            return self._format_search_result(result)
+            with tracing.span("tool search_customer", name=name) as tool_span:
+                api_client = get_api_client()
+                result = api_client.search(name)
+                self.last_result = result
+                tool_span.set_attribute("hits", result.total_results)
+                return self._format_search_result(result)
+        except RunCancelledError:
+            raise
         except Exception as e:
             return f"Error searching for customer '{name}': {str(e)}"
     
-    def _format_search_result(self, result: Dict[str, Any]) -> str:
+    def _format_search_result(self, result: SearchResult) -> str:
         """Format the search result for the AI"""
-        if "error" in result:
-            return f"Search failed: {result['error']} - {result.get('details', 'No details available')}"
+        if result.error:
+            return f"Search failed: {result.error} - {result.details or 'No details available'}"
         
-        results = result.get("results", [])
-        if not results:
-            return f"No companies found matching '{result.get('search_term', 'the search term')}'"
+        search_term = result.search_term or "the search term"
+        hits = result.hits
+        if not hits:
+            if result.variants:
+                tried = ", ".join(f"'{variant}'" for variant in result.variants)
+                return f"No companies found matching '{search_term}' (also tried {tried})"
+            return f"No companies found matching '{search_term}'"
         
-        if len(results) == 1:
-            company = results[0]
-            return f"Found 1 company: {company.get('varname', 'Unknown')} (Account: {company.get('account_no', 'Unknown')}) - Match Score: {company.get('score', 'N/A')}%"
+        if len(hits) == 1 and not result.truncated:
+            return f"Found 1 company: {self._format_hit(hits[0])}"
         
         # Multiple results
-        formatted_results = []
-        for i, company in enumerate(results[:5], 1):  # Limit to top 5
-            formatted_results.append(
-                f"{i}. {company.get('varname', 'Unknown')} (Account: {company.get('account_no', 'Unknown')}) - Match Score: {company.get('score', 'N/A')}%"
-            )
+        formatted_results = [
+            f"{i}. {self._format_hit(hit)}"
+            for i, hit in enumerate(hits[:Config.SEARCH_TOP_K], 1)
+        ]
         
-        return f"Found {len(results)} companies matching '{result.get('search_term', 'the search term')}':\n" + "\n".join(formatted_results)
+        if result.truncated:
+            header = f"Found more than {len(formatted_results)} companies matching '{search_term}', top {len(formatted_results)} by match score"
+        else:
+            header = f"Found {len(hits)} companies matching '{search_term}'"
+        return f"{header}:\n" + "\n".join(formatted_results)
+    
+    def _format_hit(self, hit: SearchHit) -> str:
+        score = hit.score if hit.score is not None else "N/A"
+        return f"{hit.varname or 'Unknown'} (Account: {hit.account_no or 'Unknown'}) - Match Score: {score}%"
 
 class GetCreditScoreTool(BaseTool):
     """Tool for getting credit score information"""
     
     name: str = "get_credit_score"
     description: str = "Get detailed credit score information for a specific customer ID. Use this after finding the correct customer with search_customer tool."
+    # Search tool of the same conversation; its matches are no longer offered once a score is fetched
+    search_tool: Optional[SearchCustomerTool] = None
+    # Accounts whose reports this conversation has shown, oldest first
+    served_accounts: List[str] = []
     
     def _run(self, customer_id: str) -> str:
         """Run the tool synchronously"""
+        if self.search_tool is not None:
+            self.search_tool.last_result = None
         try:
-            api_client = get_api_client()
-            # Run async function in sync context
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            result = loop.run_until_complete(api_client.get_credit_score(customer_id))
-            loop.close()
-            return self._format_credit_score_result(result)
+            with tracing.span("tool get_credit_score", customer_id=customer_id):
+                # Uses the prefetched result when search_customer already started it
+                result = self.fetch_report(customer_id)
+                return self._format_credit_score_result(result)
+        except RunCancelledError:
+            raise
         except Exception as e:
             return f"Error getting credit score for customer ID '{customer_id}': {str(e)}"
     
-    def _format_credit_score_result(self, result: Dict[str, Any]) -> str:
+    def fetch_report(self, customer_id: str) -> CreditReport:
+        """Fetch a report that is shown to the user, recording it in the score history"""
+        report = get_api_client().fetch_credit_score(customer_id, record_history=True)
+        if report.error is None and report.account_no and report.account_no not in self.served_accounts:
+            self.served_accounts.append(report.account_no)
+        return report
+    
+    def _format_credit_score_result(self, report: CreditReport) -> str:
         """Format the credit score result for the AI"""
-        if "error" in result:
-            return f"Credit score retrieval failed: {result['error']} - {result.get('details', 'No details available')}"
+        if report.error:
+            return f"Credit score retrieval failed: {report.error} - {report.details or 'No details available'}"
         
-        # Handle the new API response format
-        status = result.get("status", "Unknown")
-        message = result.get("message", "")
-        company_name = result.get("company_name", "Unknown Company")
-        account_no = result.get("account_no", "Unknown")
-        credit_score = result.get("credit_score", 0)
-        risk_level = result.get("risk_level", "Unknown")
-        description = result.get("description", "")
-        recommendation = result.get("recommendation", "")
-        components = result.get("components", {})
-        flags = result.get("flags", {})
-        calculation_time = result.get("calculation_time_ms", 0)
+        credit_score = report.credit_score if report.credit_score is not None else 0
+        calculation_time = report.calculation_time_ms if report.calculation_time_ms is not None else 0
         
         # Format the response
         response_parts = [
-            f"Credit Score Report for: {company_name}",
-            f"Account Number: {account_no}",
-            f"Status: {status}",
+            f"Credit Score Report for: {report.company_name or 'Unknown Company'}",
+            f"Account Number: {report.account_no or 'Unknown'}",
+            f"Status: {report.status or 'Unknown'}",
             f"",
             f"Overall Credit Score: {credit_score}",
-            f"Risk Level: {risk_level}",
-            f"Description: {description}",
-            f"Recommendation: {recommendation}",
+            f"Risk Level: {report.risk_level or 'Unknown'}",
+            f"Description: {report.description}",
+            f"Recommendation: {report.recommendation}",
             f"Calculation Time: {calculation_time}ms",
             f""
         ]
         
-        if components:
+        if report.components:
             response_parts.extend([
                 f"Score Components:",
-                *[f"- {key}: {value}" for key, value in components.items()]
+                *[f"- {key}: {value}" for key, value in report.components]
             ])
         
-        if flags:
+        if report.flags:
             response_parts.extend([
                 f"",
                 f"Flags:",
-                *[f"- {key}: {value}" for key, value in flags.items()]
+                *[f"- {key}: {value}" for key, value in report.flags]
             ])
         
+        # Standard explanations, so the model does not have to write its own
+        interpretation = format_interpretation(report)
+        if interpretation:
+            if response_parts[-1]:
+                response_parts.append(f"")
+            response_parts.append(interpretation)
+        
         return "\n".join(response_parts)
-
-class CompanySelectionTool(BaseTool):
-    """Tool for helping users select the correct company when multiple matches are found"""
-    
-    name: str = "select_company"
-    description: str = "Help user select the correct company from multiple search results. Use this when search_customer returns multiple companies."
-    
-    def _run(self, company_list: str) -> str:
-        """Run the tool synchronously"""
-        return f"Multiple companies found. Please select the correct one from the list above. You can specify the company name or number to proceed with the credit score analysis." 
\ No newline at end of file
@@ -0,0 +1,57 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+class ResultCache:
+    """Thread-safe LRU cache whose entries expire after a fixed TTL"""
+    
+    def __init__(self, max_entries: int = 256, ttl: float = 300.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+    
+    def get(self, key: str) -> Optional[Any]:
+        """Get a live entry, or None if it is missing or expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+    
+    def set(self, key: str, value: Any) -> None:
+        """Store an entry, evicting the least recently used ones beyond max_entries"""
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    
+    def pop(self, key: str, value: Any = None) -> None:
+        """Remove an entry; if value is given, only when it is still the stored value"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (value is None or entry[1] is value):
+                del self._entries[key]
+    
+    def resize(self, max_entries: int, ttl: float) -> None:
+        """Change the limits, evicting the least recently used entries beyond max_entries (new TTL applies to new entries)"""
+        with self._lock:
+            self.max_entries = max_entries
+            self.ttl = ttl
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+    
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
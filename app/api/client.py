@@ -1,15 +1,32 @@
+import asyncio
 import httpx
 import json
-from typing import Dict, List, Optional, Any
+from contextlib import asynccontextmanager
+from concurrent.futures import CancelledError, Future
+from typing import Dict, Optional, Any, Tuple
 from config import Config
+from metrics import metrics
+from background import get_background_loop, get_worker_pool
+from admission import OverloadedError, get_backend_admission
+from cancellation import RunCancelledError, wait_for
+import tracing
+from api.cache import ResultCache
+from api.models import SearchHit, SearchResult, CreditReport
+from api.normalization import query_variants
+from api.history import get_history_store
+from api.streaming import ResponseTooLargeError, read_json_array, read_limited
 
 class CreditScoreAPIClient:
     """Client for interacting with the Credit Score API"""
     
-    def __init__(self):
+    def __init__(self, transport: Optional[httpx.AsyncBaseTransport] = None):
+        """
+        Args:
+            transport: httpx transport to send requests through instead of the
+                network, e.g. a recording or replaying transport (see replay.py)
+        """
         self.base_url = Config.CREDIT_SCORE_API_URL
         self.api_key = Config.CREDIT_SCORE_API_KEY
-        self.timeout = 30.0
         
         # Set up headers
         self.headers = {
@@ -19,8 +36,161 @@ class CreditScoreAPIClient:
         
         if self.api_key:
             self.headers["Authorization"] = f"Bearer {self.api_key}"
+        
+        # Pooled HTTP client, created lazily on the background loop (see _get_http)
+        self._http: Optional[httpx.AsyncClient] = None
+        self._http_pool_size = None
+        self._transport = transport
+        
+        # Credit score results (or in-flight prefetch futures) keyed by account_no
+        self.cache = ResultCache(
+            max_entries=Config.RESULT_CACHE_MAX_ENTRIES,
+            ttl=Config.RESULT_CACHE_TTL_SECONDS
+        )
+        # Performance profile the cache limits were taken from
+        self._profile = Config.PERF_PROFILE
+    
+    def _apply_profile(self):
+        """Pick up a reloaded performance profile's cache limits"""
+        if self._profile is not Config.PERF_PROFILE:
+            self._profile = Config.PERF_PROFILE
+            self.cache.resize(Config.RESULT_CACHE_MAX_ENTRIES, Config.RESULT_CACHE_TTL_SECONDS)
+    
+    def _get_http(self) -> httpx.AsyncClient:
+        """
+        Get the pooled HTTP client, keeping connections (and TLS sessions) alive between calls
+        
+        The client is bound to the event loop it is first used on, so the client's
+        coroutines must run on the shared background loop (see run()). When a
+        reloaded profile changes BACKEND_POOL_SIZE, a new pool replaces the old one,
+        which is closed once requests still using it have timed out.
+        """
+        if self._http is not None and self._http_pool_size != Config.BACKEND_POOL_SIZE:
+            old_http = self._http
+            self._http = None
+            asyncio.get_running_loop().call_later(
+                Config.BACKEND_TIMEOUT_SECONDS,
+                lambda: asyncio.ensure_future(old_http.aclose())
+            )
+        if self._http is None:
+            self._http_pool_size = Config.BACKEND_POOL_SIZE
+            self._http = httpx.AsyncClient(
+                timeout=Config.BACKEND_TIMEOUT_SECONDS,
+                limits=httpx.Limits(
+                    max_connections=Config.BACKEND_POOL_SIZE,
+                    max_keepalive_connections=Config.BACKEND_POOL_SIZE
+                ),
+                transport=self._transport
+            )
+        return self._http
+    
+    async def warm_connections(self, count: int = 1) -> int:
+        """
+        Open up to `count` pooled connections by requesting the API root concurrently
+        
+        Returns:
+            Number of requests that got a response
+        """
+        client = self._get_http()
+        
+        async def ping():
+            try:
+                await client.get(f"{self.base_url}/", headers=self.headers, timeout=Config.BACKEND_TIMEOUT_SECONDS)
+                return True
+            except httpx.HTTPError:
+                return False
+        
+        results = await asyncio.gather(*[ping() for _ in range(max(count, 1))])
+        return sum(results)
+    
+    def run(self, coro):
+        """
+        Run one of the client's coroutines from synchronous code on the shared background loop
+        
+        Raises:
+            OverloadedError: If the backend admission controller sheds the call
+            RunCancelledError: If the current agent run is cancelled while waiting
+        """
+        return wait_for(self._submit(coro))
+    
+    def search(self, name: str) -> SearchResult:
+        """
+        Search for the likely spellings of a company name concurrently
+        
+        Blocking; for synchronous callers (e.g. tools). The name is searched as typed,
+        without legal-entity affixes (บริษัท, จำกัด, Co., Ltd., ...), in its registered
+        Thai form and without tone marks (up to SEARCH_MAX_VARIANTS spellings), so one
+        call finds what would otherwise take the agent several retries. Each spelling
+        is admitted as its own backend call; spellings shed by admission are skipped.
+        
+        Args:
+            name: Company name to search for
+            
+        Returns:
+            SearchResult with the merged top hits, or with error set if every search failed
+        """
+        variants = query_variants(name, Config.SEARCH_MAX_VARIANTS) or [name]
+        futures = []
+        for variant in variants:
+            try:
+                futures.append(self._submit(self._search_customer(variant)))
+            except OverloadedError as e:
+                if not futures:
+                    return SearchResult.failure(name, "Service busy", str(e))
+                metrics.increment("search.variants_shed", len(variants) - len(futures))
+                break
+        
+        try:
+            results = [wait_for(future) for future in futures]
+        except RunCancelledError:
+            # Only the awaited future is registered with the token; stop the other spellings too
+            for future in futures:
+                future.cancel()
+            raise
+        if len(results) == 1:
+            result = results[0]
+        else:
+            result = SearchResult.merge(name, results, max_hits=Config.SEARCH_TOP_K)
+            metrics.increment("search.variants", len(results))
+        self.prefetch_top_match(result.hits)
+        return result
+    
+    def _submit(self, coro, blocking: bool = True) -> Future:
+        """
+        Admit a backend call and schedule it on the background loop
+        
+        Raises:
+            OverloadedError: If the backend admission controller sheds the call
+        """
+        self._apply_profile()
+        admission = get_backend_admission()
+        try:
+            session_id = admission.enter(blocking=blocking)
+        except OverloadedError:
+            coro.close()
+            raise
+        parent_span = tracing.current_span.get()
+        return get_background_loop().submit(self._release_after(coro, admission, session_id, parent_span))
     
-    async def search_customer(self, name: str) -> Dict[str, Any]:
+    async def _release_after(self, coro, admission, session_id, parent_span=None):
+        # Each task has its own context, so this only affects spans started by coro
+        tracing.current_span.set(parent_span)
+        try:
+            return await coro
+        finally:
+            admission.leave(session_id)
+    
+    @asynccontextmanager
+    async def _stream(self, url: str, params: Dict[str, Any]):
+        """Stream a GET request in its own span, sending the trace context to the backend"""
+        with tracing.span(f"GET {url[len(self.base_url):]}", params=params) as request_span:
+            headers = {**self.headers, **tracing.propagation_headers()}
+            async with self._get_http().stream("GET", url, params=params, headers=headers,
+                                               timeout=Config.BACKEND_TIMEOUT_SECONDS) as response:
+                request_span.set_attribute("status_code", response.status_code)
+                yield response
+    
+    async def search_customer(self, name: str) -> SearchResult:
         """
         Search for customers by name using fuzzy matching
         
@@ -28,53 +198,46 @@ class CreditScoreAPIClient:
             name: Company name to search for
             
         Returns:
-            Dictionary containing search results
+            SearchResult with the top hits, or with error set
         """
+        result = await self._search_customer(name)
+        self.prefetch_top_match(result.hits)
+        return result
+    
+    async def _search_customer(self, name: str) -> SearchResult:
+        """One search-customer request, without prefetching"""
         url = f"{self.base_url}/search-customer"
         params = {"quote": name}
+        if Config.SEARCH_LIMIT_PARAM:
+            params[Config.SEARCH_LIMIT_PARAM] = Config.SEARCH_TOP_K
         
         try:
-            async with httpx.AsyncClient(timeout=self.timeout) as client:
-                response = await client.get(
-                    url,
-                    params=params,
-                    headers=self.headers
-                )
-                
+            # Stream the body: results arrive best match first, so parsing stops after the top K
+            async with self._stream(url, params) as response:
                 if response.status_code == 200:
-                    results = response.json()
-                    return {
-                        "results": results,
-                        "total_results": len(results),
-                        "search_term": name
-                    }
+                    results, complete = await read_json_array(
+                        response.aiter_bytes(),
+                        max_items=Config.SEARCH_TOP_K,
+                        max_bytes=Config.MAX_RESPONSE_BYTES
+                    )
+                    return SearchResult.from_json(name, results, truncated=not complete)
                 else:
-                    return {
-                        "error": f"API request failed with status {response.status_code}",
-                        "details": response.text,
-                        "results": []
-                    }
-                    
+                    return SearchResult.failure(
+                        name,
+                        f"API request failed with status {response.status_code}",
+                        await self._read_error_details(response)
+                    )
+                
+        except ResponseTooLargeError as e:
+            return SearchResult.failure(name, "Response too large", str(e))
         except httpx.TimeoutException:
-            return {
-                "error": "Request timed out",
-                "details": "The API request took too long to complete",
-                "results": []
-            }
+            return SearchResult.failure(name, "Request timed out", "The API request took too long to complete")
         except httpx.RequestError as e:
-            return {
-                "error": "Request failed",
-                "details": str(e),
-                "results": []
-            }
+            return SearchResult.failure(name, "Request failed", str(e))
         except Exception as e:
-            return {
-                "error": "Unexpected error",
-                "details": str(e),
-                "results": []
-            }
+            return SearchResult.failure(name, "Unexpected error", str(e))
     
-    async def get_credit_score(self, customer_id: str) -> Dict[str, Any]:
+    async def get_credit_score(self, customer_id: str) -> CreditReport:
         """
         Get credit score information for a specific customer
         
@@ -82,42 +245,145 @@ class CreditScoreAPIClient:
             customer_id: The customer ID (account_no) to get credit score for
             
         Returns:
-            Dictionary containing credit score information
+            CreditReport with the credit score information, or with error set
         """
         url = f"{self.base_url}/query-credit-score"
         params = {"account_no": customer_id}
         
         try:
-            async with httpx.AsyncClient(timeout=self.timeout) as client:
-                response = await client.get(
-                    url,
-                    params=params,
-                    headers=self.headers
-                )
-                
+            async with self._stream(url, params) as response:
                 if response.status_code == 200:
-                    return response.json()
+                    body = await read_limited(response.aiter_bytes(), Config.MAX_RESPONSE_BYTES)
+                    return CreditReport.from_json(json.loads(body), max_items=Config.MAX_REPORT_ITEMS)
                 else:
-                    return {
-                        "error": f"API request failed with status {response.status_code}",
-                        "details": response.text
-                    }
-                    
+                    return CreditReport.failure(
+                        f"API request failed with status {response.status_code}",
+                        await self._read_error_details(response)
+                    )
+                
+        except ResponseTooLargeError as e:
+            return CreditReport.failure("Response too large", str(e))
         except httpx.TimeoutException:
-            return {
-                "error": "Request timed out",
-                "details": "The API request took too long to complete"
-            }
+            return CreditReport.failure("Request timed out", "The API request took too long to complete")
         except httpx.RequestError as e:
-            return {
-                "error": "Request failed",
-                "details": str(e)
-            }
+            return CreditReport.failure("Request failed", str(e))
         except Exception as e:
-            return {
-                "error": "Unexpected error",
-                "details": str(e)
-            }
+            return CreditReport.failure("Unexpected error", str(e))
+    
+    def _record_snapshot(self, report: CreditReport):
+        """Append a successful report to the local history store without blocking the caller"""
+        store = get_history_store()
+        if store is None or report.error is not None:
+            return
+        
+        def record():
+            try:
+                store.record(report)
+            except Exception as e:
+                print(f"Error recording credit score snapshot: {e}")
+        
+        get_worker_pool().submit(record)
+    
+    async def _read_error_details(self, response, max_bytes: int = 2048) -> str:
+        """Read at most max_bytes of an error response body as text"""
+        body = bytearray()
+        async for chunk in response.aiter_bytes():
+            body.extend(chunk)
+            if len(body) >= max_bytes:
+                break
+        return bytes(body[:max_bytes]).decode("utf-8", errors="replace")
+    
+    def fetch_credit_score(self, customer_id: str, record_history: bool = False) -> CreditReport:
+        """
+        Get credit score information, reusing a cached or in-flight prefetched result
+        
+        Blocking; call from synchronous code (e.g. tools), not from the event loop.
+        
+        Args:
+            customer_id: The customer ID (account_no) to get credit score for
+            record_history: Append a successful report to the score history; only for
+                reports shown to a user, not for prefetches or warm-up
+            
+        Returns:
+            CreditReport with the credit score information, or with error set
+        """
+        key = str(customer_id).strip()
+        future = self.cache.get(key)
+        if future is not None:
+            try:
+                # Shared with other callers, so a cancelled run only stops waiting for it
+                result = wait_for(future, owned=False)
+            except CancelledError:
+                result = None
+            if result is not None and result.error is None:
+                metrics.increment("prefetch.hits")
+                if record_history:
+                    self._record_snapshot(result)
+                return result
+            # A failed prefetch is not cached; fall through and try again directly
+            self.cache.pop(key, future)
+        
+        metrics.increment("prefetch.misses")
+        try:
+            future = self._submit(self.get_credit_score(key))
+        except OverloadedError as e:
+            return CreditReport.failure("Service busy", str(e))
+        self.cache.set(key, future)
+        try:
+            result = wait_for(future)
+        except RunCancelledError:
+            self.cache.pop(key, future)
+            raise
+        if result.error is not None:
+            self.cache.pop(key, future)
+        elif record_history:
+            self._record_snapshot(result)
+        return result
+    
+    def prefetch_top_match(self, hits: Tuple[SearchHit, ...]) -> Optional[Future]:
+        """
+        Start fetching the credit score of a clear top search match in the background
+        
+        The agent almost always asks for the score of such a match on its next
+        iteration, so the fetch overlaps with the LLM call in between.
+        
+        Args:
+            hits: Search hits from the backend
+            
+        Returns:
+            The prefetch future, or None if no match qualified
+        """
+        if not hits:
+            return None
+        
+        ranked = sorted(hits, key=lambda hit: hit.score or 0, reverse=True)
+        top_score = ranked[0].score or 0
+        if top_score < Config.PREFETCH_SCORE_THRESHOLD:
+            return None
+        if len(ranked) > 1 and top_score - (ranked[1].score or 0) < Config.PREFETCH_MIN_MARGIN:
+            return None
+        
+        key = ranked[0].account_no
+        if not key:
+            return None
+        if self.cache.get(key) is not None:
+            return None
+        
+        try:
+            # Speculative work never queues; it is skipped when the backend is saturated
+            future = self._submit(self.get_credit_score(key), blocking=False)
+        except OverloadedError:
+            metrics.increment("prefetch.shed")
+            return None
+        self.cache.set(key, future)
+        future.add_done_callback(lambda done: self._drop_failed_prefetch(key, done))
+        metrics.increment("prefetch.started")
+        return future
+    
+    def _drop_failed_prefetch(self, key: str, future: Future):
+        """Evict a prefetch that failed so the tool retries instead of reusing the error"""
+        if future.cancelled() or future.exception() is not None or future.result().error is not None:
+            self.cache.pop(key, future)
     
     def is_api_available(self) -> bool:
         """
@@ -128,7 +394,7 @@ class CreditScoreAPIClient:
         """
         try:
             import requests
-            response = requests.get(f"{self.base_url}/", timeout=5)
+            response = requests.get(f"{self.base_url}/", timeout=Config.HEALTH_CHECK_TIMEOUT_SECONDS)
             return response.status_code == 200
         except:
             return False 
\ No newline at end of file
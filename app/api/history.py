@@ -0,0 +1,155 @@
+import json
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, List, Optional, Sequence, Tuple
+from config import Config
+from api.models import CreditReport
+
+@dataclass(slots=True, frozen=True)
+class ScoreSnapshot:
+    """A credit score as it was when it was fetched"""
+
+    account_no: str
+    recorded_at: float
+    credit_score: Optional[float]
+    risk_level: str
+    company_name: str
+    components: Tuple[Tuple[str, Any], ...] = ()
+
+@dataclass(slots=True, frozen=True)
+class TrackedAccount:
+    """An account with at least one stored snapshot"""
+
+    account_no: str
+    company_name: str
+    snapshots: int
+    last_recorded_at: float
+
+class ScoreHistoryStore:
+    """
+    Append-only SQLite store of credit score snapshots
+
+    Every credit report shown to a user is appended (prefetches and warm-up are
+    not); rows are never updated. The
+    (account_no, recorded_at) index keeps per-company range queries fast, so trends
+    can be shown without calling the backend.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS score_snapshots (
+                account_no TEXT NOT NULL,
+                recorded_at REAL NOT NULL,
+                credit_score REAL,
+                risk_level TEXT,
+                company_name TEXT,
+                components TEXT
+            )
+        """)
+        self._conn.execute("""
+            CREATE INDEX IF NOT EXISTS idx_score_snapshots_account_time
+            ON score_snapshots (account_no, recorded_at)
+        """)
+        self._conn.commit()
+
+    def record(self, report: CreditReport, recorded_at: Optional[float] = None) -> None:
+        """Append a snapshot of a successful credit report"""
+        if report.error is not None or not report.account_no:
+            return
+        row = (
+            report.account_no,
+            recorded_at if recorded_at is not None else time.time(),
+            report.credit_score,
+            report.risk_level,
+            report.company_name,
+            json.dumps(dict(report.components), ensure_ascii=False)
+        )
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO score_snapshots "
+                "(account_no, recorded_at, credit_score, risk_level, company_name, components) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                row
+            )
+            self._conn.commit()
+
+    def get_snapshots(self, account_no: str, start: Optional[float] = None,
+                      end: Optional[float] = None, limit: int = 0) -> List[ScoreSnapshot]:
+        """
+        Get the snapshots of one account in a time range, oldest first
+
+        Args:
+            account_no: Account to query
+            start: Earliest timestamp (inclusive), or None for no lower bound
+            end: Latest timestamp (inclusive), or None for no upper bound
+            limit: Keep only the most recent `limit` snapshots (0 for all)
+        """
+        query = "SELECT account_no, recorded_at, credit_score, risk_level, company_name, components " \
+                "FROM score_snapshots WHERE account_no = ? AND recorded_at >= ? AND recorded_at <= ? " \
+                "ORDER BY recorded_at DESC"
+        params: list = [account_no, start if start is not None else float("-inf"),
+                        end if end is not None else float("inf")]
+        if limit:
+            query += " LIMIT ?"
+            params.append(limit)
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        return [
+            ScoreSnapshot(
+                account_no=row[0],
+                recorded_at=row[1],
+                credit_score=row[2],
+                risk_level=row[3] or "",
+                company_name=row[4] or "",
+                components=tuple(json.loads(row[5] or "{}").items())
+            )
+            for row in reversed(rows)
+        ]
+
+    def list_accounts(self, limit: int = 100, account_nos: Optional[Sequence[str]] = None) -> List[TrackedAccount]:
+        """
+        Get the accounts with stored snapshots, most recently fetched first
+
+        Args:
+            limit: Maximum number of accounts to return
+            account_nos: Only consider these accounts (None for all)
+        """
+        where = ""
+        params: list = []
+        if account_nos is not None:
+            if not account_nos:
+                return []
+            where = f"WHERE account_no IN ({', '.join('?' * len(account_nos))}) "
+            params.extend(account_nos)
+        params.append(limit)
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT account_no, MAX(company_name), COUNT(*), MAX(recorded_at) "
+                f"FROM score_snapshots {where}GROUP BY account_no ORDER BY MAX(recorded_at) DESC LIMIT ?",
+                params
+            ).fetchall()
+        return [TrackedAccount(row[0], row[1] or "", row[2], row[3]) for row in rows]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+# Global history store instance
+_history_store = None
+_history_store_lock = threading.Lock()
+
+def get_history_store() -> Optional[ScoreHistoryStore]:
+    """Get or create the history store, or None if HISTORY_DB_PATH is empty"""
+    global _history_store
+    if _history_store is None and Config.HISTORY_DB_PATH:
+        with _history_store_lock:
+            if _history_store is None:
+                _history_store = ScoreHistoryStore(Config.HISTORY_DB_PATH)
+    return _history_store
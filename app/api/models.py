@@ -0,0 +1,151 @@
+import sys
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+def _text(value: Any, default: str = "") -> str:
+    """Coerce a JSON value to an interned string (repeated values share one object)"""
+    if value is None:
+        return default
+    return sys.intern(str(value))
+
+def _number(value: Any) -> Optional[float]:
+    """Coerce a JSON value to a number, or None if it is not numeric"""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return value
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+def _items(value: Any, limit: int = 0) -> Tuple[Tuple[str, Any], ...]:
+    """Convert a JSON object to a compact tuple of (interned key, value) pairs"""
+    if not isinstance(value, dict):
+        return ()
+    pairs = tuple((sys.intern(str(key)), item) for key, item in value.items())
+    return pairs[:limit] if limit else pairs
+
+@dataclass(slots=True, frozen=True)
+class SearchHit:
+    """One company returned by the search-customer endpoint"""
+
+    account_no: str
+    varname: str
+    score: Optional[float] = None
+
+    @classmethod
+    def from_json(cls, data: Any) -> Optional["SearchHit"]:
+        """Build a hit from one raw search result, or None if it is not an object"""
+        if not isinstance(data, dict):
+            return None
+        return cls(
+            account_no=_text(data.get("account_no")).strip(),
+            varname=_text(data.get("varname")),
+            score=_number(data.get("score"))
+        )
+
+@dataclass(slots=True, frozen=True)
+class SearchResult:
+    """Top search hits for a search term, or the error that prevented the search"""
+
+    search_term: str
+    hits: Tuple[SearchHit, ...] = ()
+    truncated: bool = False
+    error: Optional[str] = None
+    details: Optional[str] = None
+    # Spelling variants that were searched along with the search term
+    variants: Tuple[str, ...] = ()
+
+    @classmethod
+    def from_json(cls, search_term: str, results: List[Any], truncated: bool = False) -> "SearchResult":
+        """Build a result from the raw search results, skipping malformed entries"""
+        hits = tuple(hit for hit in map(SearchHit.from_json, results or ()) if hit is not None)
+        return cls(search_term=search_term, hits=hits, truncated=truncated)
+
+    @classmethod
+    def merge(cls, search_term: str, results: List["SearchResult"], max_hits: int = 0) -> "SearchResult":
+        """
+        Combine the results of several spellings of one search term
+
+        Hits are de-duplicated by account_no, keeping the best match score, and
+        ordered by score. Fails only if every search failed.
+
+        Args:
+            search_term: The search term as originally given
+            results: One result per searched variant
+            max_hits: Maximum number of hits to keep (0 for all)
+        """
+        succeeded = [result for result in results if result.error is None]
+        variants = tuple(result.search_term for result in results if result.search_term != search_term)
+        if not succeeded:
+            first = results[0] if results else cls.failure(search_term, "Search failed")
+            return cls(search_term=search_term, error=first.error, details=first.details, variants=variants)
+
+        best: Dict[str, SearchHit] = {}
+        for result in succeeded:
+            for hit in result.hits:
+                key = hit.account_no or hit.varname
+                current = best.get(key)
+                if current is None or (hit.score or 0) > (current.score or 0):
+                    best[key] = hit
+        hits = sorted(best.values(), key=lambda hit: hit.score or 0, reverse=True)
+        truncated = any(result.truncated for result in succeeded) or bool(max_hits and len(hits) > max_hits)
+        if max_hits:
+            hits = hits[:max_hits]
+        return cls(search_term=search_term, hits=tuple(hits), truncated=truncated, variants=variants)
+
+    @classmethod
+    def failure(cls, search_term: str, error: str, details: str = "") -> "SearchResult":
+        return cls(search_term=search_term, error=error, details=details)
+
+    @property
+    def total_results(self) -> int:
+        return len(self.hits)
+
+@dataclass(slots=True, frozen=True)
+class CreditReport:
+    """Credit score report for one account, or the error that prevented it"""
+
+    account_no: str = ""
+    company_name: str = ""
+    status: str = ""
+    message: str = ""
+    credit_score: Optional[float] = None
+    risk_level: str = ""
+    description: str = ""
+    recommendation: str = ""
+    components: Tuple[Tuple[str, Any], ...] = ()
+    flags: Tuple[Tuple[str, Any], ...] = ()
+    calculation_time_ms: Optional[float] = None
+    error: Optional[str] = None
+    details: Optional[str] = None
+
+    @classmethod
+    def from_json(cls, data: Any, max_items: int = 0) -> "CreditReport":
+        """
+        Build a report from the raw credit-score response
+
+        Args:
+            data: Parsed JSON body
+            max_items: Maximum number of components / flags to keep (0 for all)
+        """
+        if not isinstance(data, dict):
+            return cls.failure("Unexpected response", "Credit score response is not a JSON object")
+        return cls(
+            account_no=_text(data.get("account_no")).strip(),
+            company_name=_text(data.get("company_name")),
+            status=_text(data.get("status")),
+            message=_text(data.get("message")),
+            credit_score=_number(data.get("credit_score")),
+            risk_level=_text(data.get("risk_level")),
+            description=_text(data.get("description")),
+            recommendation=_text(data.get("recommendation")),
+            components=_items(data.get("components"), max_items),
+            flags=_items(data.get("flags"), max_items),
+            calculation_time_ms=_number(data.get("calculation_time_ms"))
+        )
+
+    @classmethod
+    def failure(cls, error: str, details: str = "") -> "CreditReport":
+        return cls(error=error, details=details)
@@ -0,0 +1,75 @@
+import re
+import unicodedata
+from typing import List
+
+# Invisible characters that sneak into pasted names
+_ZERO_WIDTH = re.compile("[\u200b\u200c\u200d\u2060\ufeff\u00ad]")
+# Thai tone marks (mai ek, mai tho, mai tri, mai chattawa)
+_TONE_MARKS = re.compile("[\u0e48-\u0e4b]")
+# Sara am typed as nikhahit + sara aa, possibly with the tone mark in between
+_SARA_AM = re.compile("\u0e4d([\u0e48-\u0e4b]?)\u0e32")
+# The same combining mark typed twice in a row
+_REPEATED_MARK = re.compile("([\u0e31\u0e34-\u0e3a\u0e47-\u0e4e])\\1+")
+_THAI = re.compile("[\u0e00-\u0e7f]")
+_SPACES = re.compile(r"\s+")
+
+# Legal-entity affixes, longest first so "จำกัด (มหาชน)" wins over "จำกัด"
+_PREFIXES = [
+    "ห้างหุ้นส่วนจำกัด", "ห้างหุ้นส่วนสามัญ", "บริษัทมหาชนจำกัด", "บริษัท", "บมจ.", "บจก.", "หจก.", "บมจ", "บจก", "หจก"
+]
+_SUFFIXES = [
+    r"จำกัด\s*\(\s*มหาชน\s*\)", r"\(\s*มหาชน\s*\)", r"จำกัด", r"มหาชน",
+    r"public\s+company\s+limited", r"company\s+limited", r"co\.?\s*,?\s*ltd\.?",
+    r"pcl\.?", r"plc\.?", r"limited", r"ltd\.?", r"inc\.?", r"corp\.?", r"corporation"
+]
+_PREFIX_PATTERN = re.compile(r"^(?:" + "|".join(re.escape(prefix) for prefix in _PREFIXES) + r")\s*")
+_SUFFIX_PATTERN = re.compile(r"[\s,]*(?:" + "|".join(_SUFFIXES) + r")\s*$", re.IGNORECASE)
+
+def clean_query(name: str) -> str:
+    """
+    Normalize how a name is written without changing what it says
+
+    NFC-normalizes, drops zero-width characters and doubled Thai marks, writes
+    sara am as one character and collapses whitespace.
+    """
+    text = unicodedata.normalize("NFC", name or "")
+    text = _ZERO_WIDTH.sub("", text)
+    text = _SARA_AM.sub("\\1\u0e33", text)
+    text = _REPEATED_MARK.sub(r"\1", text)
+    return _SPACES.sub(" ", text).strip(" \t\"'")
+
+def strip_legal_affixes(name: str) -> str:
+    """Remove company-form prefixes and suffixes (บริษัท ... จำกัด, Co., Ltd., PCL, ...)"""
+    core = name
+    while True:
+        stripped = _SUFFIX_PATTERN.sub("", _PREFIX_PATTERN.sub("", core)).strip(" ,.-")
+        if stripped == core or not stripped:
+            return core
+        core = stripped
+
+def query_variants(name: str, max_variants: int = 3) -> List[str]:
+    """
+    Likely spellings of a company name to search for, best first
+
+    The name as typed (cleaned), the name without legal-entity affixes, the
+    registered Thai form "บริษัท <name> จำกัด" and the name without tone marks.
+
+    Args:
+        name: Company name as given by the user or the model
+        max_variants: Maximum number of variants to return
+
+    Returns:
+        Distinct, non-empty variants; at least the cleaned name if it is not empty
+    """
+    cleaned = clean_query(name)
+    core = strip_legal_affixes(cleaned)
+    candidates = [cleaned, core]
+    if _THAI.search(core) and not _PREFIX_PATTERN.match(core):
+        candidates.append(f"บริษัท {core} จำกัด")
+        candidates.append(_TONE_MARKS.sub("", core))
+
+    variants = []
+    for candidate in candidates:
+        if candidate and candidate not in variants:
+            variants.append(candidate)
+    return variants[:max(max_variants, 1)]
@@ -0,0 +1,116 @@
+import codecs
+import json
+from typing import Any, AsyncIterator, List, Tuple
+
+class ResponseTooLargeError(Exception):
+    """Raised when a response body exceeds the configured size limit"""
+
+_WHITESPACE = " \t\n\r"
+# Characters that can continue a number ("6" may become "6.75e2" with the next chunk)
+_NUMBER_CHARS = "0123456789.eE+-"
+_decoder = json.JSONDecoder()
+
+async def read_limited(chunks: AsyncIterator[bytes], max_bytes: int) -> bytes:
+    """
+    Read a whole response body, refusing bodies larger than max_bytes
+
+    Raises:
+        ResponseTooLargeError: If the body is larger than max_bytes
+    """
+    body = bytearray()
+    async for chunk in chunks:
+        body.extend(chunk)
+        if max_bytes and len(body) > max_bytes:
+            raise ResponseTooLargeError(f"Response body exceeds {max_bytes} bytes")
+    return bytes(body)
+
+async def read_json_array(chunks: AsyncIterator[bytes], max_items: int, max_bytes: int,
+                          object_key: str = "results") -> Tuple[List[Any], bool]:
+    """
+    Incrementally parse the items of a JSON array body, stopping after max_items
+
+    Only the bytes needed for the first max_items items are read and decoded, so a
+    huge result list costs no more than its head. A body that is an object is read
+    in full (still bounded by max_bytes) and its object_key list is used instead.
+
+    Args:
+        chunks: Async iterator over the raw body (e.g. response.aiter_bytes())
+        max_items: Number of items to return (0 for all)
+        max_bytes: Maximum number of bytes to read (0 for no limit)
+        object_key: Key holding the list when the body is an object
+
+    Returns:
+        Tuple of (items, complete) where complete is False if items were left unread
+
+    Raises:
+        ResponseTooLargeError: If more than max_bytes are needed
+        ValueError: If the body is not valid JSON
+    """
+    text_decoder = codecs.getincrementaldecoder("utf-8")()
+    buffer = ""
+    position = 0
+    received = 0
+    started = False
+    items: List[Any] = []
+    chunk_iter = chunks.__aiter__()
+    exhausted = False
+
+    while True:
+        # Parse as many complete items as the buffer holds
+        while True:
+            while position < len(buffer) and buffer[position] in _WHITESPACE:
+                position += 1
+            if position >= len(buffer):
+                break
+
+            if not started:
+                if buffer[position] == "{":
+                    rest = await read_limited(chunk_iter, max(max_bytes - received, 1) if max_bytes else 0)
+                    body = json.loads(buffer[position:] + text_decoder.decode(rest, final=True))
+                    results = body.get(object_key, []) if isinstance(body, dict) else []
+                    if max_items and len(results) > max_items:
+                        return list(results[:max_items]), False
+                    return list(results), True
+                if buffer[position] != "[":
+                    raise ValueError("Expected a JSON array or object")
+                started = True
+                position += 1
+                continue
+
+            char = buffer[position]
+            if char == "]":
+                return items, True
+            if char == ",":
+                position += 1
+                continue
+
+            try:
+                item, end = _decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if exhausted:
+                    raise
+                break  # incomplete item, read more
+            if not exhausted and (end >= len(buffer) or buffer[end] in _NUMBER_CHARS):
+                break  # a scalar may continue in the next chunk
+            items.append(item)
+            position = end
+            if max_items and len(items) >= max_items:
+                rest = buffer[position:].lstrip(_WHITESPACE)
+                return items, rest.startswith("]")
+
+        if exhausted:
+            raise ValueError("Unexpected end of JSON array")
+
+        # Drop what has been consumed and read the next chunk
+        buffer = buffer[position:]
+        position = 0
+        try:
+            chunk = await chunk_iter.__anext__()
+        except StopAsyncIteration:
+            exhausted = True
+            buffer += text_decoder.decode(b"", final=True)
+            continue
+        received += len(chunk)
+        if max_bytes and received > max_bytes:
+            raise ResponseTooLargeError(f"Response body exceeds {max_bytes} bytes")
+        buffer += text_decoder.decode(chunk)
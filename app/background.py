@@ -0,0 +1,65 @@
+import asyncio
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Coroutine, Optional
+
+class BackgroundLoop:
+    """An asyncio event loop running in a daemon thread, shared by synchronous callers"""
+    
+    def __init__(self, name: str = "background-loop"):
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run_forever, name=name, daemon=True)
+        self._thread.start()
+    
+    def _run_forever(self):
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_forever()
+    
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        return self._loop
+    
+    @property
+    def thread_id(self) -> Optional[int]:
+        return self._thread.ident
+    
+    def submit(self, coro: Coroutine) -> Future:
+        """
+        Schedule a coroutine on the loop without waiting for it
+        
+        Returns:
+            A concurrent.futures.Future; cancelling it cancels the underlying task
+        """
+        return asyncio.run_coroutine_threadsafe(coro, self._loop)
+    
+    def run(self, coro: Coroutine, timeout: Optional[float] = None) -> Any:
+        """Run a coroutine on the loop and block until it finishes"""
+        if threading.current_thread() is self._thread:
+            coro.close()
+            raise RuntimeError("BackgroundLoop.run() cannot be called from the loop thread")
+        return self.submit(coro).result(timeout)
+
+# Global background loop instance
+_background_loop = None
+_background_loop_lock = threading.Lock()
+
+def get_background_loop() -> BackgroundLoop:
+    """Get or create the shared background loop"""
+    global _background_loop
+    if _background_loop is None:
+        with _background_loop_lock:
+            if _background_loop is None:
+                _background_loop = BackgroundLoop()
+    return _background_loop
+
+# Global worker pool for blocking agent runs
+_worker_pool = None
+
+def get_worker_pool() -> ThreadPoolExecutor:
+    """Get or create the thread pool that runs agent turns off the UI thread"""
+    global _worker_pool
+    if _worker_pool is None:
+        with _background_loop_lock:
+            if _worker_pool is None:
+                _worker_pool = ThreadPoolExecutor(thread_name_prefix="agent-worker")
+    return _worker_pool
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Memory benchmark for API result models
+Compares the per-session footprint of keeping raw JSON dicts versus the slotted
+SearchResult / CreditReport models for a long conversation
+"""
+
+import json
+import sys
+import os
+import tracemalloc
+
+# Add current directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from api.models import SearchResult, CreditReport
+
+RISK_LEVELS = ["Low", "Medium", "High"]
+
+def make_search_body(turn: int) -> bytes:
+    """Raw search-customer body as the backend sends it"""
+    results = [
+        {
+            "account_no": f"{100000 + (turn * 5 + i) % 40}",
+            "varname": f"บริษัท ทดสอบ {(turn * 5 + i) % 40} จำกัด",
+            "score": 95 - i * 7
+        }
+        for i in range(5)
+    ]
+    return json.dumps(results, ensure_ascii=False).encode("utf-8")
+
+def make_report_body(turn: int) -> bytes:
+    """Raw query-credit-score body as the backend sends it"""
+    report = {
+        "status": "success",
+        "message": "Credit score calculated successfully",
+        "company_name": f"บริษัท ทดสอบ {turn % 40} จำกัด",
+        "account_no": f"{100000 + turn % 40}",
+        "credit_score": 600 + turn % 250,
+        "risk_level": RISK_LEVELS[turn % 3],
+        "description": "Moderate credit risk with stable payment behaviour",
+        "recommendation": "Standard credit terms with periodic review",
+        "components": {f"component_{i}": (turn + i) % 100 for i in range(20)},
+        "flags": {f"flag_{i}": (turn + i) % 2 == 0 for i in range(10)},
+        "calculation_time_ms": 12
+    }
+    return json.dumps(report, ensure_ascii=False).encode("utf-8")
+
+def measure(turns: int, build) -> int:
+    """Bytes still allocated after keeping `turns` turns of results in a session list"""
+    bodies = [(make_search_body(turn), make_report_body(turn)) for turn in range(turns)]
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    session = [build(search_body, report_body) for search_body, report_body in bodies]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del session
+    return after - before
+
+def build_dicts(search_body: bytes, report_body: bytes):
+    results = json.loads(search_body)
+    return (
+        {"results": results, "total_results": len(results), "search_term": "ทดสอบ"},
+        json.loads(report_body)
+    )
+
+def build_models(search_body: bytes, report_body: bytes):
+    return (
+        SearchResult.from_json("ทดสอบ", json.loads(search_body)),
+        CreditReport.from_json(json.loads(report_body))
+    )
+
+def main():
+    print("📏 Per-session memory footprint (search + credit report per turn)")
+    print(f"{'turns':>6} {'raw dicts':>12} {'models':>12} {'saved':>7}")
+    for turns in (10, 50, 200, 1000):
+        dict_bytes = measure(turns, build_dicts)
+        model_bytes = measure(turns, build_models)
+        saved = (1 - model_bytes / dict_bytes) * 100 if dict_bytes else 0.0
+        print(f"{turns:>6} {dict_bytes / 1024:>10.1f}KB {model_bytes / 1024:>10.1f}KB {saved:>6.1f}%")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+import threading
+from concurrent.futures import CancelledError, Future, TimeoutError as FutureTimeoutError
+from contextvars import ContextVar
+from typing import Any, Optional, Set
+
+class RunCancelledError(Exception):
+    """Raised inside an agent run once its cancellation token has been cancelled"""
+
+class CancellationToken:
+    """
+    Cooperative cancellation for one agent run
+
+    Futures waited on through the token (LLM calls, backend requests) are cancelled
+    when the token is, which cancels the underlying asyncio tasks and the HTTP
+    requests they are awaiting.
+    """
+
+    # How often a waiting thread re-checks the token
+    POLL_INTERVAL = 0.1
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._futures: Set[Future] = set()
+        self.reason = ""
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self, reason: str = "") -> None:
+        """Cancel the run and every future currently waited on through this token"""
+        with self._lock:
+            if self._event.is_set():
+                return
+            self.reason = reason
+            self._event.set()
+            futures = list(self._futures)
+        for future in futures:
+            future.cancel()
+
+    def raise_if_cancelled(self) -> None:
+        if self._event.is_set():
+            raise RunCancelledError(self.reason or "Run cancelled")
+
+    def wait(self, future: Future, owned: bool = True) -> Any:
+        """
+        Wait for a future, giving up as soon as the token is cancelled
+
+        Args:
+            future: The future to wait for
+            owned: Whether cancelling the run should also cancel the future; pass
+                False for futures shared with other callers (e.g. cached prefetches)
+
+        Raises:
+            RunCancelledError: If the token is cancelled before the future finishes
+        """
+        if owned:
+            with self._lock:
+                self._futures.add(future)
+        try:
+            while True:
+                if self._event.is_set():
+                    if owned:
+                        future.cancel()
+                    self.raise_if_cancelled()
+                try:
+                    return future.result(timeout=self.POLL_INTERVAL)
+                except FutureTimeoutError:
+                    continue
+                except CancelledError:
+                    self.raise_if_cancelled()
+                    raise
+        finally:
+            if owned:
+                with self._lock:
+                    self._futures.discard(future)
+
+# Token of the agent run the current call belongs to; set by CreditScoreChain.process_message
+current_cancel_token: ContextVar[Optional[CancellationToken]] = ContextVar("current_cancel_token", default=None)
+
+def wait_for(future: Future, owned: bool = True) -> Any:
+    """Wait for a future, honouring the current run's cancellation token if there is one"""
+    token = current_cancel_token.get()
+    if token is None:
+        return future.result()
+    return token.wait(future, owned=owned)
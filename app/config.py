@@ -1,15 +1,235 @@
+import json
 import os
+from dataclasses import asdict, dataclass, fields
+from typing import Any, Dict, Mapping, Optional
 from dotenv import load_dotenv
 
 # Load environment variables from .env if present
 load_dotenv()
 
+@dataclass(frozen=True)
+class PerformanceProfile:
+    """
+    Performance-relevant settings of one deployment, validated on creation
+    
+    Every field is published as the Config attribute of the same name in upper case
+    (backend_pool_size -> Config.BACKEND_POOL_SIZE), which is also the environment
+    variable that overrides it. Components read those attributes at use time and
+    rebuild what they derive from them (pools, limiters, chat clients) when a new
+    profile is applied, so Config.reload_profile() takes effect without a restart.
+    """
+    
+    name: str = "default"
+    
+    # Model tiers: OPENAI_MODEL for final answers, OPENAI_FAST_MODEL for planning and
+    # tool calls (empty disables routing); the fast tier's answers are capped at
+    # OPENAI_FAST_MAX_TOKENS before they are escalated
+    openai_model: str = "gpt-4"
+    openai_fast_model: str = "gpt-4o-mini"
+    openai_temperature: float = 0.1
+    openai_fast_max_tokens: int = 256
+    agent_max_iterations: int = 5
+    
+    # Credit score backend: keep-alive pool size and request timeouts
+    backend_pool_size: int = 20
+    backend_timeout_seconds: float = 30.0
+    health_check_timeout_seconds: float = 5.0
+    
+    # Response handling: search results are parsed incrementally and only the top
+    # SEARCH_TOP_K are kept; larger bodies than MAX_RESPONSE_BYTES are rejected, and
+    # at most MAX_REPORT_ITEMS score components / flags are kept from a report
+    search_top_k: int = 5
+    max_response_bytes: int = 1024 * 1024
+    max_report_items: int = 50
+    # Spellings of a company name (without บริษัท/จำกัด, Co., Ltd., ...) searched
+    # concurrently per search_customer call; 1 searches the name as given only
+    search_max_variants: int = 3
+    
+    # Result cache for backend responses (also holds speculative prefetches)
+    result_cache_max_entries: int = 256
+    result_cache_ttl_seconds: float = 300.0
+    
+    # Prefetch the credit score of a search match scoring at least this (percent);
+    # with several matches the top one must also lead the runner-up by PREFETCH_MIN_MARGIN
+    prefetch_score_threshold: float = 90.0
+    prefetch_min_margin: float = 10.0
+    
+    # Admission control (0 disables a limit). Calls over the concurrency limits queue
+    # for up to ADMISSION_QUEUE_TIMEOUT_SECONDS; beyond the queue limit they are
+    # rejected. Rate limits are in requests/second.
+    admission_queue_timeout_seconds: float = 10.0
+    backend_max_concurrent: int = 16
+    backend_max_per_session: int = 4
+    backend_max_queue: int = 32
+    backend_rate_limit: float = 20.0
+    backend_rate_burst: float = 40.0
+    llm_max_concurrent: int = 8
+    llm_max_per_session: int = 2
+    llm_max_queue: int = 16
+    llm_rate_limit: float = 5.0
+    llm_rate_burst: float = 10.0
+    
+    # Memory budget: messages of conversation history kept per session
+    max_conversation_history: int = 50
+    
+    def __post_init__(self):
+        problems = []
+        for field in fields(self):
+            value = getattr(self, field.name)
+            if field.type is float and isinstance(value, int) and not isinstance(value, bool):
+                object.__setattr__(self, field.name, float(value))
+            elif not isinstance(value, field.type) or isinstance(value, bool):
+                problems.append(f"{field.name} must be {field.type.__name__}, got {value!r}")
+        if problems:
+            raise ValueError(f"Invalid performance profile: {'; '.join(problems)}")
+        
+        positive = ("openai_fast_max_tokens", "agent_max_iterations", "backend_pool_size",
+                    "backend_timeout_seconds", "health_check_timeout_seconds", "search_top_k",
+                    "search_max_variants", "result_cache_max_entries", "max_conversation_history")
+        for name in positive:
+            if getattr(self, name) <= 0:
+                problems.append(f"{name} must be greater than 0")
+        for field in fields(self):
+            value = getattr(self, field.name)
+            if field.type in (int, float) and value < 0:
+                problems.append(f"{field.name} must not be negative")
+        if not self.openai_model:
+            problems.append("openai_model must not be empty")
+        if not 0 <= self.openai_temperature <= 2:
+            problems.append("openai_temperature must be between 0 and 2")
+        if problems:
+            raise ValueError(f"Invalid performance profile: {'; '.join(problems)}")
+    
+    @classmethod
+    def from_values(cls, values: Mapping[str, Any]) -> "PerformanceProfile":
+        """
+        Build a profile from field values given as strings (environment) or JSON values
+        
+        Raises:
+            ValueError: For unknown fields, unparsable numbers or invalid values
+        """
+        types = {field.name: field.type for field in fields(cls)}
+        unknown = sorted(set(values) - set(types))
+        if unknown:
+            raise ValueError(f"Unknown performance profile settings: {', '.join(unknown)}")
+        
+        parsed = {}
+        for name, value in values.items():
+            if isinstance(value, str) and types[name] is not str:
+                try:
+                    value = types[name](value)
+                except ValueError:
+                    raise ValueError(f"{name.upper()} must be {types[name].__name__}, got {value!r}")
+            parsed[name] = value
+        return cls(**parsed)
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+# Named presets, as overrides of the PerformanceProfile defaults
+PERFORMANCE_PRESETS: Dict[str, Dict[str, Any]] = {
+    "default": {},
+    # Shortest time to first answer: fewer, smaller steps, eager prefetching and
+    # shedding load early instead of queueing it
+    "low-latency": {
+        "openai_fast_max_tokens": 192,
+        "agent_max_iterations": 4,
+        "backend_pool_size": 32,
+        "backend_timeout_seconds": 10.0,
+        "health_check_timeout_seconds": 2.0,
+        "search_top_k": 3,
+        "result_cache_ttl_seconds": 600.0,
+        "prefetch_score_threshold": 80.0,
+        "prefetch_min_margin": 5.0,
+        "admission_queue_timeout_seconds": 2.0,
+        "backend_max_queue": 16,
+        "llm_max_queue": 8,
+        "max_conversation_history": 20
+    },
+    # Most sessions per replica: larger pools and limits, longer queues, a bigger
+    # cache and only confident prefetches
+    "high-throughput": {
+        "backend_pool_size": 64,
+        "search_max_variants": 2,
+        "result_cache_max_entries": 2048,
+        "prefetch_score_threshold": 95.0,
+        "admission_queue_timeout_seconds": 20.0,
+        "backend_max_concurrent": 48,
+        "backend_max_queue": 128,
+        "backend_rate_limit": 60.0,
+        "backend_rate_burst": 120.0,
+        "llm_max_concurrent": 24,
+        "llm_max_queue": 64,
+        "llm_rate_limit": 15.0,
+        "llm_rate_burst": 30.0,
+        "max_conversation_history": 30
+    },
+    # Fewest tokens: the small model for every step, short answers, few iterations,
+    # a short history and no speculative backend calls
+    "cost-saver": {
+        "openai_model": "gpt-4o-mini",
+        "openai_temperature": 0.0,
+        "openai_fast_max_tokens": 128,
+        "agent_max_iterations": 3,
+        "search_top_k": 3,
+        "result_cache_max_entries": 1024,
+        "result_cache_ttl_seconds": 900.0,
+        "prefetch_score_threshold": 101.0,
+        "llm_rate_limit": 2.0,
+        "llm_rate_burst": 4.0,
+        "max_conversation_history": 10
+    }
+}
+
+def get_environment_overrides(environ: Mapping[str, str] = os.environ) -> Dict[str, str]:
+    """Profile fields set by their own environment variable, as field name -> raw value"""
+    return {
+        field.name: environ[field.name.upper()]
+        for field in fields(PerformanceProfile)
+        if field.name != "name" and field.name.upper() in environ
+    }
+
+def load_performance_profile(preset: Optional[str] = None, environ: Mapping[str, str] = os.environ) -> PerformanceProfile:
+    """
+    Load the performance profile from a preset, an optional JSON file and the environment
+    
+    Later sources win: the preset (argument, PERF_PROFILE or the file's "preset"
+    key, else "default"), then the fields in PERF_PROFILE_FILE, then individual
+    environment variables named after the fields (e.g. BACKEND_POOL_SIZE). Each
+    variable that replaces a preset or file value is logged.
+    
+    Raises:
+        ValueError: For an unknown preset or invalid settings
+        OSError: If PERF_PROFILE_FILE cannot be read
+    """
+    file_values: Dict[str, Any] = {}
+    path = environ.get("PERF_PROFILE_FILE")
+    if path:
+        with open(path, encoding="utf-8") as f:
+            file_values = json.load(f)
+        if not isinstance(file_values, dict):
+            raise ValueError(f"{path} must contain a JSON object")
+        file_values = dict(file_values)
+    
+    preset = preset or environ.get("PERF_PROFILE") or file_values.pop("preset", None) or "default"
+    file_values.pop("preset", None)
+    if preset not in PERFORMANCE_PRESETS:
+        raise ValueError(f"Unknown performance profile preset '{preset}' (choose from {', '.join(PERFORMANCE_PRESETS)})")
+    
+    values: Dict[str, Any] = {**PERFORMANCE_PRESETS[preset], **file_values}
+    for name, env_value in get_environment_overrides(environ).items():
+        if name in values:
+            print(f"Performance profile '{preset}': {name.upper()}={env_value} from the environment overrides {values[name]!r}")
+        values[name] = env_value
+    values["name"] = preset
+    return PerformanceProfile.from_values(values)
+
 class Config:
     """Configuration class for the credit score chatbot"""
     
-    # OpenAI Configuration
+    # OpenAI Configuration (models, temperature and the fast tier are part of the
+    # performance profile below)
     OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-    OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4")
     
     # Credit Score API Configuration
     CREDIT_SCORE_API_URL = os.getenv("CREDIT_SCORE_API_URL", "http://localhost:8000")
@@ -19,14 +239,78 @@ class Config:
     SEARCH_CUSTOMER_ENDPOINT = "/search-customer"
     CREDIT_SCORE_ENDPOINT = "/credit-score"
     
+    # Query parameter asking the search endpoint for at most SEARCH_TOP_K results; the
+    # documented API has none, so it is only sent when set (e.g. "limit")
+    SEARCH_LIMIT_PARAM = os.getenv("SEARCH_LIMIT_PARAM", "")
+    
+    # Local SQLite store of credit score snapshots for trend charts (empty disables)
+    HISTORY_DB_PATH = os.getenv("HISTORY_DB_PATH", "score_history.db")
+    
+    # Warm-up on container start: open this many backend connections, preload the
+    # cache for these comma-separated company names / account numbers, and serve
+    # /ready and /live on READINESS_PORT (0 disables) once warm
+    WARMUP_CONNECTIONS = int(os.getenv("WARMUP_CONNECTIONS", "4"))
+    WARMUP_COMPANIES = [name.strip() for name in os.getenv("WARMUP_COMPANIES", "").split(",") if name.strip()]
+    WARMUP_ACCOUNTS = [account.strip() for account in os.getenv("WARMUP_ACCOUNTS", "").split(",") if account.strip()]
+    WARMUP_OPENAI = os.getenv("WARMUP_OPENAI", "true").lower() == "true"
+    READINESS_PORT = int(os.getenv("READINESS_PORT", "8502"))
+    
+    # Request tracing: spans of sampled turns go to an in-memory ring buffer ("memory"),
+    # a JSON-lines file ("jsonl", TRACE_FILE) or nowhere ("none"); either exporter keeps
+    # the last TRACE_BUFFER_SIZE spans in memory for the admin sidebar
+    TRACE_EXPORTER = os.getenv("TRACE_EXPORTER", "memory").lower()
+    TRACE_FILE = os.getenv("TRACE_FILE", "traces.jsonl")
+    TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0.1"))
+    TRACE_BUFFER_SIZE = int(os.getenv("TRACE_BUFFER_SIZE", "2000"))
+    # Print LangChain's unstructured agent trace to stdout
+    AGENT_VERBOSE = os.getenv("AGENT_VERBOSE", "false").lower() == "true"
+    
+    # On-demand profiling: ADMIN_MODE shows the sidebar toggle, PROFILE_NEXT_N profiles
+    # the next N messages of any session; reports are written to PROFILE_OUTPUT_DIR
+    ADMIN_MODE = os.getenv("ADMIN_MODE", "false").lower() == "true"
+    PROFILE_NEXT_N = int(os.getenv("PROFILE_NEXT_N", "0"))
+    PROFILE_OUTPUT_DIR = os.getenv("PROFILE_OUTPUT_DIR", "profiles")
+    PROFILE_SAMPLE_INTERVAL_MS = float(os.getenv("PROFILE_SAMPLE_INTERVAL_MS", "5"))
+    
     # Application Configuration
     APP_TITLE = "Credit Score AI Assistant"
     APP_ICON = "💰"
     
     # Chat Configuration
-    MAX_CONVERSATION_HISTORY = 50
     CHAT_INPUT_PLACEHOLDER = "Ask about a company's credit score..."
     
+    # Active performance profile; its fields are published as class attributes
+    # (OPENAI_MODEL, BACKEND_POOL_SIZE, SEARCH_TOP_K, ...) by apply_profile()
+    PERF_PROFILE: PerformanceProfile = PerformanceProfile()
+    
+    @classmethod
+    def apply_profile(cls, profile: PerformanceProfile):
+        """Make a performance profile the active one"""
+        for field in fields(profile):
+            if field.name != "name":
+                setattr(cls, field.name.upper(), getattr(profile, field.name))
+        cls.PERF_PROFILE = profile
+    
+    @classmethod
+    def reload_profile(cls, preset: Optional[str] = None) -> bool:
+        """
+        Reload the performance profile (see load_performance_profile) at runtime
+        
+        Args:
+            preset: Preset to switch to instead of the configured one
+            
+        Returns:
+            True if the new profile was applied; on invalid settings the current
+            profile stays active
+        """
+        try:
+            profile = load_performance_profile(preset)
+        except (ValueError, OSError) as e:
+            print(f"Error loading performance profile: {e}")
+            return False
+        cls.apply_profile(profile)
+        return True
+    
     @classmethod
     def validate_config(cls):
         """Validate that required configuration is present"""
@@ -51,4 +335,7 @@ class Config:
     @classmethod
     def get_credit_score_url(cls):
         """Get the full URL for credit score endpoint"""
-        return f"{cls.CREDIT_SCORE_API_URL}{cls.CREDIT_SCORE_ENDPOINT}" 
\ No newline at end of file
+        return f"{cls.CREDIT_SCORE_API_URL}{cls.CREDIT_SCORE_ENDPOINT}" 
+
+# Invalid settings fail fast at start-up
+Config.apply_profile(load_performance_profile())
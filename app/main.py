@@ -1,8 +1,20 @@
 import streamlit as st
+import contextvars
 import os
-from config import Config
+import time
+from datetime import datetime
+from config import Config, PERFORMANCE_PRESETS, get_environment_overrides
 from ai.chain import CreditScoreChain
-from api.client import CreditScoreAPIClient
+from ai.tools import get_api_client
+from metrics import metrics
+from api.history import get_history_store
+from warmup import start_warmup, get_warmup_state
+from background import get_worker_pool
+from profiling import get_profiler
+import tracing
+
+# Warm shared resources on first import (no-op if serve.py already started it)
+start_warmup()
 
 # Page configuration
 st.set_page_config(
@@ -27,7 +39,7 @@ def initialize_components():
         
         # Initialize API client
         if st.session_state.api_client is None:
-            st.session_state.api_client = CreditScoreAPIClient()
+            st.session_state.api_client = get_api_client()
         
         # Initialize LangChain
         if st.session_state.credit_score_chain is None:
@@ -42,6 +54,236 @@ def initialize_components():
         st.error(f"Initialization Error: {str(e)}")
         return False
 
+def render_performance_metrics():
+    """Show per-tier LLM latency and token usage in the sidebar"""
+    snapshot = metrics.snapshot()
+    counters = snapshot["counters"]
+    timings = snapshot["timings"]
+    
+    for tier, model in (("fast", Config.OPENAI_FAST_MODEL), ("large", Config.OPENAI_MODEL)):
+        calls = int(counters.get(f"llm.{tier}.calls", 0))
+        if not calls:
+            continue
+        latency = timings.get(f"llm.{tier}.latency_ms", {})
+        st.text(
+            f"{tier.title()} ({model}): {calls} calls\n"
+            f"  avg {latency.get('avg', 0):.0f}ms, max {latency.get('max', 0):.0f}ms\n"
+            f"  tokens in/out: {int(counters.get(f'llm.{tier}.prompt_tokens', 0))}"
+            f"/{int(counters.get(f'llm.{tier}.completion_tokens', 0))}"
+        )
+    
+    cached = timings.get("llm.cached_prompt_tokens_per_request")
+    if cached:
+        prompt_total = timings["llm.prompt_tokens_per_request"]["total"]
+        hit_rate = cached["total"] / prompt_total * 100 if prompt_total else 0.0
+        st.text(f"Cached prompt tokens/request: {cached['avg']:.0f} ({hit_rate:.0f}% of prompt)")
+        chain = st.session_state.get("credit_score_chain")
+        if chain is not None:
+            st.text(f"Prompt prefix: {chain.prompt_prefix}")
+    
+    for name in ("llm", "backend"):
+        queue_wait = timings.get(f"admission.{name}.queue_wait_ms")
+        rejected = int(counters.get(f"admission.{name}.rejected", 0))
+        if queue_wait or rejected:
+            st.text(
+                f"{name.title()} queue wait: avg {(queue_wait or {}).get('avg', 0):.0f}ms, "
+                f"max {(queue_wait or {}).get('max', 0):.0f}ms, rejected {rejected}"
+            )
+    
+    escalations = int(counters.get("llm.escalations", 0))
+    if escalations:
+        st.text(f"Escalations to large model: {escalations}")
+    
+    cancelled = int(counters.get("runs.cancelled", 0))
+    if cancelled:
+        st.text(f"Cancelled runs: {cancelled}")
+
+def render_profiling_controls():
+    """Admin-only toggle that profiles the next N messages of this session"""
+    chain = st.session_state.get("credit_score_chain")
+    if chain is None:
+        return
+    profiler = get_profiler()
+    
+    st.header("Profiling")
+    count = st.number_input("Messages to profile", min_value=1, max_value=20, value=1, step=1)
+    if st.button("Profile next messages"):
+        profiler.arm(int(count), chain.session_id)
+    remaining = profiler.remaining(chain.session_id)
+    if remaining:
+        st.text(f"Profiling armed for {remaining} message(s)")
+    for report in profiler.reports[-3:]:
+        st.text(f"CPU: {report['cpu']}\nAllocations: {report['allocations']}")
+
+def render_profile_controls():
+    """Admin-only switch between performance presets, applied to every session without a restart"""
+    st.header("Performance Profile")
+    presets = list(PERFORMANCE_PRESETS)
+    current = Config.PERF_PROFILE.name
+    preset = st.selectbox("Preset", presets, index=presets.index(current) if current in presets else 0)
+    if st.button("Apply / reload profile"):
+        if Config.reload_profile(preset):
+            st.success(f"Profile '{Config.PERF_PROFILE.name}' applied")
+        else:
+            st.error("Invalid performance profile; the current one stays active (see logs)")
+    pinned = get_environment_overrides()
+    if pinned:
+        st.caption(
+            "Pinned by environment variables (override every preset): "
+            + ", ".join(f"{name.upper()}={value}" for name, value in pinned.items())
+        )
+    with st.expander("Active settings"):
+        st.json(Config.PERF_PROFILE.to_dict())
+
+def render_company_choices():
+    """Offer the matches of the last search as buttons; a click fetches that company's report directly"""
+    chain = st.session_state.get("credit_score_chain")
+    if chain is None:
+        return
+    choices = chain.get_company_choices()
+    if not choices:
+        return
+    
+    st.caption("Select a company:")
+    for hit in choices:
+        score = f" - {hit.score}%" if hit.score is not None else ""
+        label = f"{hit.varname or 'Unknown'} ({hit.account_no}){score}"
+        if st.button(label, key=f"choice_{hit.account_no}"):
+            st.session_state.messages.append({"role": "user", "content": label})
+            chain.cancel_active_run("superseded by company selection")
+            with st.spinner("Getting credit score..."):
+                response = chain.select_company(hit.account_no)
+            st.session_state.messages.append({"role": "assistant", "content": response})
+            st.rerun()
+
+TREND_RANGES = {
+    "Last 7 days": 7,
+    "Last 30 days": 30,
+    "Last 90 days": 90,
+    "All time": None
+}
+
+def render_score_trend():
+    """
+    Chart a company's credit score over time from the local history store (no backend calls)
+    
+    Lists the companies this session has looked up; admins see every stored company.
+    """
+    store = get_history_store()
+    chain = st.session_state.get("credit_score_chain")
+    if store is None or chain is None:
+        return
+    accounts = store.list_accounts(account_nos=None if Config.ADMIN_MODE else chain.get_viewed_accounts())
+    if not accounts:
+        return
+    
+    with st.expander("📈 Score trend"):
+        labels = {
+            account.account_no: f"{account.company_name or 'Unknown'} ({account.account_no})"
+            for account in accounts
+        }
+        account_no = st.selectbox("Company", list(labels), format_func=labels.get)
+        range_label = st.radio("Range", list(TREND_RANGES), horizontal=True)
+        
+        days = TREND_RANGES[range_label]
+        start = time.time() - days * 86400 if days else None
+        snapshots = store.get_snapshots(account_no, start=start)
+        if not snapshots:
+            st.info("No snapshots in this range.")
+            return
+        
+        st.line_chart(
+            {
+                "Time": [datetime.fromtimestamp(snapshot.recorded_at) for snapshot in snapshots],
+                "Credit Score": [snapshot.credit_score for snapshot in snapshots]
+            },
+            x="Time",
+            y="Credit Score"
+        )
+        latest = snapshots[-1]
+        st.caption(
+            f"{len(snapshots)} snapshots, latest {latest.credit_score} ({latest.risk_level or 'Unknown'}) "
+            f"on {datetime.fromtimestamp(latest.recorded_at):%Y-%m-%d %H:%M}"
+        )
+
+def session_is_active() -> bool:
+    """Whether the browser session running this script is still connected"""
+    try:
+        from streamlit.runtime import Runtime
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+        ctx = get_script_run_ctx()
+        if ctx is None or not Runtime.exists():
+            return True
+        return Runtime.instance().is_active_session(ctx.session_id)
+    except Exception:
+        return True
+
+def run_cancellable(chain, prompt: str) -> str:
+    """
+    Run chain.process_message on a worker thread, cancelling it if the script stops
+    
+    Updating the status placeholder hands control back to Streamlit, which raises
+    inside this loop when the user sends new input (rerun) or the session stops;
+    the run is then cancelled instead of finishing in the background.
+    """
+    status = st.empty()
+    # Copy the context so the worker's spans belong to this turn's trace
+    context = contextvars.copy_context()
+    future = get_worker_pool().submit(context.run, chain.process_message, prompt)
+    start = time.time()
+    try:
+        while not future.done():
+            if not session_is_active():
+                chain.cancel_active_run("session disconnected")
+                break
+            status.caption(f"Working... {time.time() - start:.0f}s")
+            try:
+                future.result(timeout=0.25)
+            except Exception:
+                pass
+    finally:
+        if not future.done():
+            chain.cancel_active_run("superseded by new input")
+    status.empty()
+    return future.result()
+
+def render_trace_view():
+    """Admin-only span tree of a recent trace (from the in-memory or JSON-lines exporter)"""
+    exporter = tracing.get_exporter()
+    if exporter is None:
+        return
+    spans = exporter.get_spans()
+    roots = [span for span in spans if span["parent_id"] is None][-10:]
+    if not roots:
+        return
+    
+    st.header("Traces")
+    labels = {
+        root["trace_id"]: f"{datetime.fromtimestamp(root['start_time']):%H:%M:%S} {root['name']} ({root['duration_ms']:.0f}ms)"
+        for root in reversed(roots)
+    }
+    trace_ids = list(labels)
+    last_trace_id = st.session_state.get("last_trace_id")
+    trace_id = st.selectbox(
+        "Trace", trace_ids, format_func=labels.get,
+        index=trace_ids.index(last_trace_id) if last_trace_id in trace_ids else 0
+    )
+    
+    children = {}
+    for span in spans:
+        if span["trace_id"] == trace_id:
+            children.setdefault(span["parent_id"], []).append(span)
+    lines = []
+    
+    def add(parent_id, depth):
+        for span in sorted(children.get(parent_id, []), key=lambda span: span["start_time"]):
+            status = "" if span["status"] == "ok" else f" [{span['status']}]"
+            lines.append(f"{'  ' * depth}{span['name']}: {span['duration_ms']:.1f}ms{status}")
+            add(span["span_id"], depth + 1)
+    
+    add(None, 0)
+    st.code("\n".join(lines), language=None)
+
 def main():
     """Main application function"""
     
@@ -67,13 +309,29 @@ def main():
         
         # Configuration info
         st.header("Configuration")
+        st.text(f"Warm-up: {get_warmup_state()['status']}")
+        st.text(f"Performance profile: {Config.PERF_PROFILE.name}")
         st.text(f"API URL: {Config.CREDIT_SCORE_API_URL}")
         st.text(f"Model: {Config.OPENAI_MODEL}")
+        if Config.OPENAI_FAST_MODEL:
+            st.text(f"Fast Model: {Config.OPENAI_FAST_MODEL}")
+        
+        # Performance metrics
+        st.header("Performance")
+        render_performance_metrics()
     
     # Initialize components
     if not initialize_components():
         st.stop()
     
+    if Config.ADMIN_MODE:
+        with st.sidebar:
+            render_profile_controls()
+            render_profiling_controls()
+    
+    # Score trends from previously fetched reports
+    render_score_trend()
+    
     # Display chat history
     for message in st.session_state.messages:
         with st.chat_message(message["role"]):
@@ -90,13 +348,25 @@ def main():
         with st.chat_message("assistant"):
             with st.spinner("Analyzing your request..."):
                 try:
-                    response = st.session_state.credit_score_chain.process_message(prompt)
+                    # A run still going from an earlier script execution is superseded
+                    st.session_state.credit_score_chain.cancel_active_run("superseded by new input")
+                    with tracing.span("chat_turn"):
+                        st.session_state.last_trace_id = tracing.get_trace_id()
+                        response = run_cancellable(st.session_state.credit_score_chain, prompt)
                     st.markdown(response)
                     st.session_state.messages.append({"role": "assistant", "content": response})
                 except Exception as e:
                     error_message = f"I apologize, but I encountered an error: {str(e)}. Please try again."
                     st.error(error_message)
                     st.session_state.messages.append({"role": "assistant", "content": error_message})
+    
+    # Choices from an ambiguous search, answered without another agent turn
+    render_company_choices()
+    
+    # After the turn, so its trace is already listed
+    if Config.ADMIN_MODE:
+        with st.sidebar:
+            render_trace_view()
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
@@ -0,0 +1,54 @@
+import threading
+from typing import Dict, Any
+
+class MetricsRegistry:
+    """Thread-safe, in-process counters and timing summaries"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, float] = {}
+        self._timings: Dict[str, Dict[str, float]] = {}
+
+    def increment(self, name: str, value: float = 1) -> None:
+        """Add value to the named counter"""
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def observe(self, name: str, value: float) -> None:
+        """Record one observation (e.g. a latency in milliseconds) for the named timing"""
+        with self._lock:
+            timing = self._timings.get(name)
+            if timing is None:
+                timing = {"count": 0, "total": 0.0, "max": 0.0}
+                self._timings[name] = timing
+            timing["count"] += 1
+            timing["total"] += value
+            timing["max"] = max(timing["max"], value)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Get a copy of all metrics
+
+        Returns:
+            Dictionary with "counters" and "timings" (count, avg, max, total)
+        """
+        with self._lock:
+            timings = {
+                name: {
+                    "count": timing["count"],
+                    "avg": timing["total"] / timing["count"] if timing["count"] else 0.0,
+                    "max": timing["max"],
+                    "total": timing["total"]
+                }
+                for name, timing in self._timings.items()
+            }
+            return {"counters": dict(self._counters), "timings": timings}
+
+    def reset(self) -> None:
+        """Clear all metrics"""
+        with self._lock:
+            self._counters.clear()
+            self._timings.clear()
+
+# Global metrics registry shared by the chain, tools and API client
+metrics = MetricsRegistry()
@@ -0,0 +1,166 @@
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+from config import Config
+from metrics import metrics
+
+class StackSampler:
+    """
+    Sampling CPU profiler for a set of threads
+
+    Every `interval` seconds the current stack of each target thread is recorded;
+    the result is written in collapsed-stack format ("frame;frame;frame count"),
+    which flamegraph.pl, speedscope and inferno read directly. Time spent waiting
+    on I/O shows up as the frames that block (e.g. Future.result).
+    """
+
+    def __init__(self, threads: Dict[int, str], interval: float = 0.005):
+        self.threads = threads
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            for thread_id, thread_name in self.threads.items():
+                frame = frames.get(thread_id)
+                if frame is None:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.append(thread_name)
+                self.samples[";".join(reversed(stack))] += 1
+
+    def write_collapsed(self, path: str) -> None:
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in self.samples.most_common():
+                f.write(f"{stack} {count}\n")
+
+class ProfilingController:
+    """
+    Profiles the next N process_message calls, on demand and without a restart
+
+    Armed from the admin sidebar (per session) or PROFILE_NEXT_N (any session, at
+    start-up). Each profiled call writes a collapsed-stack CPU profile and a
+    tracemalloc top-allocations report to PROFILE_OUTPUT_DIR.
+    """
+
+    def __init__(self, output_dir: str, interval: float, top_allocations: int = 25):
+        self.output_dir = output_dir
+        self.interval = interval
+        self.top_allocations = top_allocations
+        self._lock = threading.Lock()
+        self._remaining: Dict[Optional[str], int] = {}
+        self._tracemalloc_users = 0
+        # Whether tracemalloc was started here (not e.g. by PYTHONTRACEMALLOC), so only then stopped
+        self._started_tracemalloc = False
+        self.reports: List[Dict[str, str]] = []
+
+    def arm(self, count: int, session_id: Optional[str] = None) -> None:
+        """Profile the next `count` calls of one session (or of any session if None)"""
+        with self._lock:
+            self._remaining[session_id] = max(count, 0)
+
+    def remaining(self, session_id: Optional[str] = None) -> int:
+        with self._lock:
+            return self._remaining.get(session_id, 0)
+
+    def _take(self, session_id: str) -> bool:
+        with self._lock:
+            for key in (session_id, None):
+                if self._remaining.get(key, 0) > 0:
+                    self._remaining[key] -= 1
+                    return True
+        return False
+
+    @contextmanager
+    def maybe_profile(self, session_id: str):
+        """Profile the enclosed block if a profile is armed for this session"""
+        if not self._take(session_id):
+            yield
+            return
+
+        from background import get_background_loop
+        threads = {threading.get_ident(): "agent", get_background_loop().thread_id: "background-loop"}
+        sampler = StackSampler(threads, self.interval)
+
+        with self._lock:
+            if self._tracemalloc_users == 0 and not tracemalloc.is_tracing():
+                tracemalloc.start(25)
+                self._started_tracemalloc = True
+            self._tracemalloc_users += 1
+        baseline = tracemalloc.take_snapshot()
+        sampler.start()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            sampler.stop()
+            snapshot = tracemalloc.take_snapshot()
+            with self._lock:
+                self._tracemalloc_users -= 1
+                if self._tracemalloc_users == 0 and self._started_tracemalloc:
+                    tracemalloc.stop()
+                    self._started_tracemalloc = False
+            try:
+                self._write_reports(session_id, sampler, baseline, snapshot, elapsed_ms)
+            except Exception as e:
+                print(f"Error writing profile: {e}")
+
+    def _write_reports(self, session_id: str, sampler: StackSampler, baseline, snapshot, elapsed_ms: float):
+        os.makedirs(self.output_dir, exist_ok=True)
+        prefix = os.path.join(self.output_dir, f"{time.strftime('%Y%m%d-%H%M%S')}-{session_id[:8]}")
+
+        cpu_path = f"{prefix}.collapsed"
+        sampler.write_collapsed(cpu_path)
+
+        filters = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__)]
+        snapshot = snapshot.filter_traces(filters)
+        baseline = baseline.filter_traces(filters)
+        alloc_path = f"{prefix}.alloc.txt"
+        with open(alloc_path, "w", encoding="utf-8") as f:
+            f.write(f"process_message took {elapsed_ms:.1f}ms, {sum(sampler.samples.values())} CPU samples\n\n")
+            f.write(f"Top {self.top_allocations} allocation growth during the call:\n")
+            for stat in snapshot.compare_to(baseline, "lineno")[:self.top_allocations]:
+                f.write(f"{stat}\n")
+            f.write(f"\nTop {self.top_allocations} live allocations after the call:\n")
+            for stat in snapshot.statistics("lineno")[:self.top_allocations]:
+                f.write(f"{stat}\n")
+
+        metrics.increment("profiling.captures")
+        with self._lock:
+            self.reports.append({"cpu": cpu_path, "allocations": alloc_path})
+            del self.reports[:-20]
+
+# Global profiling controller
+_profiler = None
+
+def get_profiler() -> ProfilingController:
+    """Get or create the profiling controller, arming it from PROFILE_NEXT_N on first use"""
+    global _profiler
+    if _profiler is None:
+        _profiler = ProfilingController(
+            Config.PROFILE_OUTPUT_DIR,
+            Config.PROFILE_SAMPLE_INTERVAL_MS / 1000
+        )
+        if Config.PROFILE_NEXT_N:
+            _profiler.arm(Config.PROFILE_NEXT_N)
+    return _profiler
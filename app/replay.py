@@ -0,0 +1,159 @@
+import asyncio
+import json
+import os
+import time
+from collections import defaultdict, deque
+from typing import Any, Dict, List, Optional
+import httpx
+
+# Services a cassette records exchanges with
+BACKEND = "backend"
+OPENAI = "openai"
+
+class CassetteMismatchError(Exception):
+    """Raised when a replayed request has no matching recorded exchange"""
+
+def _encode_body(content: bytes) -> Any:
+    """Keep JSON bodies readable in the cassette; anything else is stored as text"""
+    if not content:
+        return None
+    try:
+        return json.loads(content)
+    except ValueError:
+        return content.decode("utf-8", errors="replace")
+
+def _decode_body(body: Any) -> bytes:
+    if body is None:
+        return b""
+    if isinstance(body, str):
+        return body.encode("utf-8")
+    return json.dumps(body, ensure_ascii=False).encode("utf-8")
+
+def _request_key(service: str, method: str, path: str, query: str) -> tuple:
+    return (service, method, path, "&".join(sorted(query.split("&"))) if query else "")
+
+class Cassette:
+    """
+    Recorded LLM and backend HTTP exchanges of one conversation
+
+    Stored as JSON: the user messages (or company selections) and answers of each
+    turn, the settings that change which requests are made (models, top-K), and
+    every exchange with its method, path, query, response body and recorded latency.
+    Hosts, headers (including API keys) and request bodies (the full prompts) are
+    not stored. `source` is "recorded" for live sessions and "synthetic" for
+    fixtures generated against stand-in services, described by `note`.
+    """
+
+    def __init__(self, turns: Optional[List[Dict[str, Any]]] = None,
+                 interactions: Optional[List[Dict[str, Any]]] = None,
+                 settings: Optional[Dict[str, Any]] = None,
+                 source: str = "recorded", note: str = ""):
+        self.turns = turns or []
+        self.interactions = interactions or []
+        self.settings = settings or {}
+        self.source = source
+        self.note = note
+
+    @classmethod
+    def load(cls, path: str) -> "Cassette":
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(data.get("turns"), data.get("interactions"), data.get("settings"),
+                   data.get("source", "recorded"), data.get("note", ""))
+
+    def save(self, path: str) -> None:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({
+                "version": 1,
+                "source": self.source,
+                "note": self.note,
+                "settings": self.settings,
+                "turns": self.turns,
+                "interactions": self.interactions
+            }, f, ensure_ascii=False, indent=2)
+            f.write("\n")
+
+    def bodies(self, service: str, path: str) -> List[bytes]:
+        """Recorded response bodies of successful requests to one endpoint"""
+        return [
+            _decode_body(interaction["response"]["body"])
+            for interaction in self.interactions
+            if interaction["service"] == service and interaction["request"]["path"] == path
+            and interaction["response"]["status"] == 200
+        ]
+
+class RecordingTransport(httpx.AsyncBaseTransport):
+    """Sends requests through another transport and appends each exchange to a cassette"""
+
+    def __init__(self, cassette: Cassette, service: str, transport: Optional[httpx.AsyncBaseTransport] = None):
+        self.cassette = cassette
+        self.service = service
+        self.transport = transport or httpx.AsyncHTTPTransport()
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        start = time.perf_counter()
+        response = await self.transport.handle_async_request(request)
+        try:
+            content = b"".join([chunk async for chunk in response.stream])
+        finally:
+            await response.aclose()
+        elapsed_ms = round((time.perf_counter() - start) * 1000, 1)
+        content_type = response.headers.get("content-type", "")
+
+        self.cassette.interactions.append({
+            "service": self.service,
+            "request": {
+                "method": request.method,
+                "path": request.url.path,
+                "query": request.url.query.decode("ascii")
+            },
+            "response": {
+                "status": response.status_code,
+                "content_type": content_type,
+                "body": _encode_body(content),
+                "elapsed_ms": elapsed_ms
+            }
+        })
+        return httpx.Response(response.status_code, headers={"content-type": content_type},
+                              content=content, request=request)
+
+    async def aclose(self) -> None:
+        await self.transport.aclose()
+
+class ReplayTransport(httpx.AsyncBaseTransport):
+    """
+    Answers requests from a cassette instead of the network
+
+    Requests are matched on method, path and query; repeated requests to the same
+    endpoint (e.g. successive chat completions) get the recorded responses in
+    order. Request bodies are not compared, so prompt changes can still be replayed.
+    """
+
+    def __init__(self, cassette: Cassette, service: str, simulate_latency: bool = False):
+        self.service = service
+        self.simulate_latency = simulate_latency
+        self.errors: List[str] = []
+        self._pending: Dict[tuple, deque] = defaultdict(deque)
+        for interaction in cassette.interactions:
+            if interaction["service"] == service:
+                request = interaction["request"]
+                key = _request_key(service, request["method"], request["path"], request["query"])
+                self._pending[key].append(interaction["response"])
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        key = _request_key(self.service, request.method, request.url.path, request.url.query.decode("ascii"))
+        pending = self._pending.get(key)
+        if not pending:
+            message = f"No recorded {self.service} response for {request.method} {request.url.path}?{request.url.query.decode('ascii')}"
+            self.errors.append(message)
+            raise CassetteMismatchError(message)
+        recorded = pending.popleft()
+        if self.simulate_latency:
+            await asyncio.sleep(recorded.get("elapsed_ms", 0) / 1000)
+        return httpx.Response(recorded["status"], headers={"content-type": recorded["content_type"]},
+                              content=_decode_body(recorded["body"]), request=request)
+
+    def unused(self) -> int:
+        """Number of recorded exchanges the replay did not request"""
+        return sum(len(pending) for pending in self._pending.values())
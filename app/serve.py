@@ -0,0 +1,28 @@
+#!/usr/bin/env python3
+"""
+Container entrypoint: start warm-up, then run the Streamlit app in the same process
+so the first session reuses the warmed-up clients, connections and caches.
+SIGHUP reloads the performance profile without a restart.
+
+Usage: python serve.py [streamlit run options]
+"""
+
+import os
+import signal
+import sys
+
+# Add current directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from streamlit.web import cli as stcli
+from config import Config
+from warmup import start_warmup
+
+if __name__ == "__main__":
+    # kill -HUP reloads the performance profile (PERF_PROFILE, PERF_PROFILE_FILE, env)
+    if hasattr(signal, "SIGHUP"):
+        signal.signal(signal.SIGHUP, lambda signum, frame: Config.reload_profile())
+    start_warmup()
+    main_script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py")
+    sys.argv = ["streamlit", "run", main_script, *sys.argv[1:]]
+    sys.exit(stcli.main())
@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+Synthetic Replay Cassettes
+Generates the synthetic cassettes in cassettes/ by running conversations through
+CreditScoreChain, the tools and the API client against in-process stand-ins for
+OpenAI and the credit score backend. They exercise the request patterns of a clear
+search match, several close matches and a company selection until recorded
+sessions (test_replay.py --record) replace them. Their recorded latencies are not
+representative; the CPU time of our own code, which the replay test measures, is.
+
+Usage:
+  python synthetic_cassettes.py               # regenerate every synthetic cassette
+"""
+
+import difflib
+import json
+import os
+import re
+import sys
+from dataclasses import replace
+
+# Add current directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import httpx
+from config import Config
+from api.normalization import clean_query, strip_legal_affixes
+from replay import Cassette
+from test_replay import CASSETTE_DIR, RECORDED_SETTINGS, apply_settings, record_conversation
+
+# Settings the synthetic conversations are generated with
+SETTINGS = {"OPENAI_MODEL": "gpt-4o", "OPENAI_FAST_MODEL": "gpt-4o-mini", "SEARCH_TOP_K": 5, "SEARCH_LIMIT_PARAM": ""}
+
+# Conversations to generate; "select:<account_no>" picks one of the offered companies
+CONVERSATIONS = {
+    "synthetic_clear_match": [
+        "What is the credit score of บริษัท โพธิ์ จำกัด?",
+        "What is the credit score of บริษัท โพธิ์เงิน จำกัด?"
+    ],
+    "synthetic_close_matches": [
+        "What is the credit score of โพธิ์ทอง?",
+        "select:A1042",
+        "What is the credit score of บริษัท โพธิ์ทอง ขนส่ง จำกัด?"
+    ]
+}
+
+NOTE = ("Synthetic fixture generated by synthetic_cassettes.py against stand-in services; "
+        "recorded latencies and token usage are not from live OpenAI or backend calls.")
+
+# Stand-in backend data: several companies with close names and distinct reports
+COMPANIES = {
+    "A1001": {
+        "company_name": "บริษัท โพธิ์ จำกัด", "credit_score": 724, "risk_level": "Low",
+        "description": "Good credit quality with steady payment behaviour",
+        "recommendation": "Standard 60-day terms are appropriate",
+        "components": {"payment_history": 82, "debt_ratio": 0.41, "business_age": 18},
+        "flags": {"late_payment": False}
+    },
+    "A1041": {
+        "company_name": "บริษัท โพธิ์ทอง การค้า จำกัด", "credit_score": 655, "risk_level": "Medium",
+        "description": "Fair credit quality; two invoices were paid late last quarter",
+        "recommendation": "Offer 30-day terms with a reduced credit limit",
+        "components": {"payment_history": 64, "credit_utilization": 0.72, "business_age": 6},
+        "flags": {"late_payment": True}
+    },
+    "A1042": {
+        "company_name": "บริษัท โพธิ์ทอง พัฒนา จำกัด", "credit_score": 781, "risk_level": "Very Low",
+        "description": "Very Good credit quality with strong cash reserves",
+        "recommendation": "Eligible for extended 90-day terms",
+        "components": {"payment_history": 91, "current_ratio": 2.3, "business_age": 24},
+        "flags": {"late_payment": False}
+    },
+    "A1043": {
+        "company_name": "บริษัท โพธิ์ทอง ขนส่ง จำกัด", "credit_score": 598, "risk_level": "Medium",
+        "description": "Fair credit quality with high leverage",
+        "recommendation": "Require a deposit or collateral for new orders",
+        "components": {"payment_history": 70, "debt_ratio": 0.83, "business_age": 4},
+        "flags": {"high_debt": True, "new_company": True}
+    },
+    "A2210": {
+        "company_name": "บริษัท โพธิ์เงิน จำกัด", "credit_score": 540, "risk_level": "High",
+        "description": "Poor credit quality; a lawsuit over unpaid invoices is pending",
+        "recommendation": "Extend credit only against a bank guarantee",
+        "components": {"payment_history": 48, "legal_records": 1, "business_age": 9},
+        "flags": {"lawsuit": True, "late_payment": True}
+    }
+}
+
+# Lowest match score the stand-in search returns (percent)
+MIN_MATCH_SCORE = 50.0
+
+def _match_score(query: str, name: str) -> float:
+    """Fuzzy match score (percent) of two names, ignoring legal-entity affixes"""
+    query_core = strip_legal_affixes(clean_query(query))
+    name_core = strip_legal_affixes(clean_query(name))
+    return round(difflib.SequenceMatcher(None, query_core, name_core).ratio() * 100, 1)
+
+def backend_handler(request: httpx.Request) -> httpx.Response:
+    """Stand-in for the credit score backend"""
+    if request.url.path == Config.SEARCH_CUSTOMER_ENDPOINT:
+        query = request.url.params.get("quote", "")
+        hits = [
+            {"account_no": account_no, "varname": company["company_name"],
+             "score": _match_score(query, company["company_name"])}
+            for account_no, company in COMPANIES.items()
+        ]
+        hits = sorted((hit for hit in hits if hit["score"] >= MIN_MATCH_SCORE), key=lambda hit: hit["score"], reverse=True)
+        return httpx.Response(200, json=hits)
+
+    account_no = request.url.params.get("account_no", "")
+    company = COMPANIES.get(account_no)
+    if company is None:
+        return httpx.Response(404, json={"status": "error", "message": f"Account {account_no} not found"})
+    return httpx.Response(200, json={
+        "status": "success", "account_no": account_no, "calculation_time_ms": 35 + len(account_no), **company
+    })
+
+_SEARCH_HIT = re.compile(r"^(?:\d+\. |Found 1 company: )(.+?) \(Account: (\w+)\) - Match Score: ([\d.]+)%", re.MULTILINE)
+_ASKED_NAME = re.compile(r"credit score of (.+?)\??$")
+
+class StandInOpenAI:
+    """
+    Stand-in for the chat completions API that plays the agent's usual moves
+
+    Searches for the company the user asks about, fetches the score of a clear
+    match, lists close matches for the user to pick from and summarizes a credit
+    report. Token usage is estimated from the request size, with the unchanged
+    prompt prefix (system prompt and tools) counted as cached after the first call
+    to each model, in 128-token steps like OpenAI's prompt caching.
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.seen_models = set()
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        payload = json.loads(request.content)
+        messages = payload["messages"]
+        model = payload["model"]
+        self.calls += 1
+        message = self._reply(messages)
+
+        tools = json.dumps(payload.get("tools", []), ensure_ascii=False)
+        prefix_tokens = (len(tools) + len(json.dumps(messages[0], ensure_ascii=False))) // 4
+        prompt_tokens = (len(tools) + len(json.dumps(messages, ensure_ascii=False))) // 4
+        completion_tokens = max(len(json.dumps(message, ensure_ascii=False)) // 4, 1)
+        cached_tokens = prefix_tokens // 128 * 128 if model in self.seen_models else 0
+        self.seen_models.add(model)
+
+        return httpx.Response(200, json={
+            "id": f"chatcmpl-synthetic-{self.calls}",
+            "object": "chat.completion",
+            "created": 1760000000 + self.calls,
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": message,
+                "finish_reason": "tool_calls" if message.get("tool_calls") else "stop",
+                "logprobs": None
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+                "prompt_tokens_details": {"cached_tokens": cached_tokens}
+            }
+        })
+
+    def _reply(self, messages: list) -> dict:
+        last = messages[-1]
+        if last["role"] == "user":
+            match = _ASKED_NAME.search(last["content"].strip())
+            name = match.group(1) if match else last["content"].strip()
+            return self._tool_call("search_customer", {"name": name})
+
+        content = last.get("content") or ""
+        if "Overall Credit Score:" in content:
+            company = re.search(r"Credit Score Report for: (.+)", content).group(1)
+            score = re.search(r"Overall Credit Score: (.+)", content).group(1)
+            risk = re.search(r"Risk Level: (.+)", content).group(1)
+            recommendation = re.search(r"Recommendation: (.+)", content).group(1)
+            return {"role": "assistant", "content": f"{company} has a credit score of {score} ({risk} risk). {recommendation}."}
+
+        hits = [(name, account_no, float(score)) for name, account_no, score in _SEARCH_HIT.findall(content)]
+        if not hits:
+            return {"role": "assistant", "content": "I could not find a company with that name. Could you check the spelling?"}
+        if len(hits) == 1 or (hits[0][2] >= 95 and hits[0][2] - hits[1][2] >= 10):
+            return self._tool_call("get_credit_score", {"customer_id": hits[0][1]})
+        listed = "\n".join(f"{i}. {name} (Account: {account_no})" for i, (name, account_no, _) in enumerate(hits, 1))
+        return {"role": "assistant", "content": f"I found several companies with similar names:\n{listed}\nWhich one do you mean?"}
+
+    def _tool_call(self, name: str, arguments: dict) -> dict:
+        return {
+            "role": "assistant",
+            "content": None,
+            "tool_calls": [{
+                "id": f"call_synthetic_{self.calls}",
+                "type": "function",
+                "function": {"name": name, "arguments": json.dumps(arguments, ensure_ascii=False)}
+            }]
+        }
+
+def generate(name: str, messages: list):
+    """Run one conversation against the stand-ins and save it as a synthetic cassette"""
+    apply_settings(SETTINGS)
+    cassette = Cassette(settings={setting: getattr(Config, setting) for setting in RECORDED_SETTINGS},
+                        source="synthetic", note=NOTE)
+    record_conversation(cassette, httpx.MockTransport(backend_handler), httpx.MockTransport(StandInOpenAI()), messages)
+    path = os.path.join(CASSETTE_DIR, f"{name}.json")
+    cassette.save(path)
+    print(f"Generated {len(cassette.interactions)} exchanges in {len(messages)} turns to {path}")
+
+def main():
+    # Generation must not write to the local score history
+    Config.HISTORY_DB_PATH = ""
+    # The key is never sent anywhere, but ChatOpenAI requires one
+    Config.OPENAI_API_KEY = Config.OPENAI_API_KEY or "sk-synthetic"
+    Config.apply_profile(replace(Config.PERF_PROFILE, llm_rate_limit=0.0, backend_rate_limit=0.0))
+    for name, messages in CONVERSATIONS.items():
+        generate(name, messages)
+
+if __name__ == "__main__":
+    main()
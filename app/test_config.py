@@ -6,4 +6,69 @@ os.environ["OPENAI_MODEL"] = "gpt-4"
 os.environ["CREDIT_SCORE_API_URL"] = "http://localhost:8000"
 os.environ["CREDIT_SCORE_API_KEY"] = "test_api_key"
 
-print("Test environment variables set successfully!") 
\ No newline at end of file
+print("Test environment variables set successfully!")
+
+def _raises_value_error(function, *args, **kwargs) -> bool:
+    try:
+        function(*args, **kwargs)
+    except ValueError:
+        return True
+    return False
+
+def check_performance_profile() -> bool:
+    """Check PerformanceProfile validation and the preset / file / environment precedence"""
+    import json
+    import tempfile
+    from config import PerformanceProfile, get_environment_overrides, load_performance_profile
+
+    checks = []
+
+    def check(name: str, success: bool):
+        print(f"{'✅ PASS' if success else '❌ FAIL'} - {name}")
+        checks.append(success)
+
+    # Validation
+    profile = PerformanceProfile(backend_timeout_seconds=20)
+    check("Int coerced to float", profile.backend_timeout_seconds == 20.0 and isinstance(profile.backend_timeout_seconds, float))
+    check("Wrong type rejected", _raises_value_error(PerformanceProfile, backend_pool_size="20"))
+    check("Bool rejected for int", _raises_value_error(PerformanceProfile, search_top_k=True))
+    check("Float rejected for int", _raises_value_error(PerformanceProfile, backend_pool_size=2.5))
+    check("Negative value rejected", _raises_value_error(PerformanceProfile, backend_rate_limit=-1.0))
+    check("Zero rejected where positive", _raises_value_error(PerformanceProfile, search_top_k=0))
+    check("Zero allowed for limits", PerformanceProfile(backend_max_concurrent=0).backend_max_concurrent == 0)
+    check("Temperature range", _raises_value_error(PerformanceProfile, openai_temperature=2.5))
+    check("Empty model rejected", _raises_value_error(PerformanceProfile, openai_model=""))
+    check("Strings parsed", PerformanceProfile.from_values({"backend_pool_size": "8", "backend_timeout_seconds": "2.5"}).backend_pool_size == 8)
+    check("Unparsable string rejected", _raises_value_error(PerformanceProfile.from_values, {"backend_pool_size": "many"}))
+    check("Unknown field rejected", _raises_value_error(PerformanceProfile.from_values, {"pool": 8}))
+
+    # Precedence: preset < PERF_PROFILE_FILE < environment variable
+    check("Default preset", load_performance_profile(environ={}) == PerformanceProfile())
+    profile = load_performance_profile(environ={"PERF_PROFILE": "low-latency"})
+    check("Preset applied", profile.name == "low-latency" and profile.backend_timeout_seconds == 10.0)
+    check("Argument beats PERF_PROFILE", load_performance_profile("cost-saver", environ={"PERF_PROFILE": "low-latency"}).name == "cost-saver")
+    check("Unknown preset rejected", _raises_value_error(load_performance_profile, environ={"PERF_PROFILE": "turbo"}))
+
+    with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False) as f:
+        json.dump({"preset": "low-latency", "search_top_k": 4, "backend_timeout_seconds": 8}, f)
+    try:
+        profile = load_performance_profile(environ={"PERF_PROFILE_FILE": f.name})
+        check("File preset and fields", profile.name == "low-latency" and profile.search_top_k == 4 and profile.backend_timeout_seconds == 8.0)
+        environ = {"PERF_PROFILE_FILE": f.name, "PERF_PROFILE": "cost-saver", "BACKEND_TIMEOUT_SECONDS": "20"}
+        profile = load_performance_profile(environ=environ)
+        check("PERF_PROFILE beats the file's preset", profile.name == "cost-saver" and profile.search_top_k == 4)
+        check("Environment beats file", profile.backend_timeout_seconds == 20.0)
+    finally:
+        os.unlink(f.name)
+
+    profile = load_performance_profile(environ={"PERF_PROFILE": "low-latency", "BACKEND_TIMEOUT_SECONDS": "20"})
+    check("Environment beats preset", profile.backend_timeout_seconds == 20.0 and profile.search_top_k == 3)
+    check("Environment overrides listed", get_environment_overrides({"OPENAI_MODEL": "gpt-4", "PERF_PROFILE": "x"}) == {"openai_model": "gpt-4"})
+    check("Invalid environment value rejected", _raises_value_error(load_performance_profile, environ={"SEARCH_TOP_K": "-1"}))
+
+    print(f"{sum(checks)}/{len(checks)} performance profile checks passed")
+    return all(checks)
+
+if __name__ == "__main__":
+    import sys
+    sys.exit(0 if check_performance_profile() else 1)
@@ -6,17 +6,43 @@ Excludes web/Streamlit tier
 """
 
 import asyncio
+import httpx
+import json
 import sys
 import os
+import threading
+import time
 from datetime import datetime
 
 # Add current directory to path for imports
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 from config import Config
+from admission import AdmissionController, OverloadedError, TokenBucket
+from cancellation import CancellationToken, RunCancelledError, current_cancel_token, wait_for
+from concurrent.futures import Future
 from ai.chain import CreditScoreChain
-from ai.tools import SearchCustomerTool, GetCreditScoreTool, CompanySelectionTool
+from ai.tools import SearchCustomerTool, GetCreditScoreTool
 from api.client import CreditScoreAPIClient
+from api.models import SearchHit, SearchResult, CreditReport
+from api.normalization import clean_query, query_variants, strip_legal_affixes
+from api.streaming import ResponseTooLargeError, read_json_array
+
+async def _chunks(body: bytes, size: int):
+    """Yield a response body in chunks of the given size, like response.aiter_bytes()"""
+    for start in range(0, len(body), size):
+        yield body[start:start + size]
+
+def _read(body: bytes, size: int = 3, max_items: int = 0, max_bytes: int = 0):
+    """Run read_json_array over a chunked body"""
+    return asyncio.run(read_json_array(_chunks(body, size), max_items, max_bytes))
+
+def _raises(error, function, *args, **kwargs) -> bool:
+    try:
+        function(*args, **kwargs)
+    except error:
+        return True
+    return False
 
 class IntegrationTest:
     """Integration test suite for the credit score chatbot"""
@@ -97,9 +123,6 @@ class IntegrationTest:
             credit_tool = GetCreditScoreTool()
             self.log_test("GetCreditScoreTool", True, "Tool initialized successfully")
             
-            select_tool = CompanySelectionTool()
-            self.log_test("CompanySelectionTool", True, "Tool initialized successfully")
-            
             # Test tool attributes
             self.log_test("Tool Name Attributes", 
                          search_tool.name == "search_customer", 
@@ -120,20 +143,13 @@ class IntegrationTest:
             search_tool = SearchCustomerTool()
             
             # Test search tool with mock response
-            test_result = search_tool._format_search_result({
-                "results": [
-                    {
-                        "id": "test_001",
-                        "name": "บริษัท โพธิ์ จำกัด",
-                        "name_en": "Pho Company Limited",
-                        "tax_id": "0123456789012",
-                        "address": "123 ถนนสุขุมวิท กรุงเทพฯ",
-                        "match_score": 0.95
-                    }
-                ],
-                "total_results": 1,
-                "search_term": "โพธิ์"
-            })
+            test_result = search_tool._format_search_result(SearchResult.from_json("โพธิ์", [
+                {
+                    "account_no": "test_001",
+                    "varname": "บริษัท โพธิ์ จำกัด",
+                    "score": 95
+                }
+            ]))
             
             self.log_test("Search Tool Formatting", 
                          "Found 1 company" in test_result, 
@@ -141,7 +157,7 @@ class IntegrationTest:
             
             # Test credit score tool formatting
             credit_tool = GetCreditScoreTool()
-            credit_result = credit_tool._format_credit_score_result({
+            credit_result = credit_tool._format_credit_score_result(CreditReport.from_json({
                 "customer_id": "test_001",
                 "company_name": "บริษัท โพธิ์ จำกัด",
                 "credit_score": {
@@ -162,7 +178,7 @@ class IntegrationTest:
                     "defaults": 0,
                     "payment_score": 92
                 }
-            })
+            }))
             
             self.log_test("Credit Score Tool Formatting", 
                          "Credit Score Report" in credit_result, 
@@ -171,6 +187,237 @@ class IntegrationTest:
         except Exception as e:
             self.log_test("Tools Execution", False, str(e))
     
+    def test_streaming_parser(self):
+        """Test incremental parsing of search-customer bodies"""
+        print("\n🌊 Testing Streaming Parser...")
+        
+        try:
+            hits = [{"account_no": f"A{i}", "varname": f"บริษัท ทดสอบ {i} จำกัด", "score": 90.5 - i} for i in range(5)]
+            body = json.dumps(hits, ensure_ascii=False).encode("utf-8")
+            
+            # Chunks of 1 byte split numbers, keys and multi-byte Thai characters
+            self.log_test("Array Body",
+                         all(_read(body, size) == (hits, True) for size in (1, 2, 7, len(body))),
+                         "Same items for every chunk size")
+            
+            self.log_test("Number Split Across Chunks",
+                         _read(b"[12345, 6.75e2]", size=2) == ([12345, 675.0], True),
+                         "Numbers are not cut at chunk boundaries")
+            
+            object_body = json.dumps({"results": hits, "total_results": 5}, ensure_ascii=False).encode("utf-8")
+            self.log_test("Object Body",
+                         _read(object_body) == (hits, True) and _read(object_body, max_items=2) == (hits[:2], False),
+                         "Items taken from the results key")
+            
+            self.log_test("Early Stop At Top K",
+                         _read(body, max_items=2) == (hits[:2], False),
+                         "Stops after K items and reports the rest as unread")
+            
+            self.log_test("Exactly K Items",
+                         _read(body, size=len(body), max_items=5) == (hits, True),
+                         "Complete when the array ends after the K-th item")
+            
+            # Stopping early means the bytes after the K-th item are never needed
+            self.log_test("Max Bytes",
+                         _raises(ResponseTooLargeError, _read, body, max_bytes=len(body) // 2)
+                         and _read(body, size=16, max_items=1, max_bytes=len(body) // 2)[0] == hits[:1],
+                         "Rejects oversized bodies unless the top K fit")
+            
+            self.log_test("Malformed Bodies",
+                         all(_raises(ValueError, _read, bad) for bad in (b"", b"[", b'[{"a": 1}', b'[{"a": }]', b'"text"', b"[1, 2")),
+                         "Truncated or invalid JSON raises ValueError")
+            
+            self.log_test("Empty Array",
+                         _read(b" [ ] ") == ([], True),
+                         "No items, complete")
+            
+        except Exception as e:
+            self.log_test("Streaming Parser", False, str(e))
+    
+    def test_query_normalization(self):
+        """Test company-name spellings and merging of their search results"""
+        print("\n🔤 Testing Query Normalization...")
+        
+        try:
+            self.log_test("Thai Affixes",
+                         all(strip_legal_affixes(name) == "โพธิ์" for name in (
+                             "บริษัท โพธิ์ จำกัด", "บจก. โพธิ์", "หจก.โพธิ์", "โพธิ์ จำกัด (มหาชน)", "บริษัทมหาชนจำกัด โพธิ์", "โพธิ์ (มหาชน)"
+                         )),
+                         "Prefixes, จำกัด and (มหาชน) removed")
+            
+            self.log_test("English Affixes",
+                         all(strip_legal_affixes(name) == "Siam Cement" for name in (
+                             "Siam Cement Co., Ltd.", "Siam Cement Co.,Ltd", "Siam Cement Company Limited", "Siam Cement Public Company Limited", "Siam Cement PCL"
+                         )),
+                         "Co., Ltd., Company Limited and PCL removed")
+            
+            self.log_test("Clean Query",
+                         clean_query("  โพธิ\u0e4c\u200b  ทอง ") == "โพธิ์ ทอง" and clean_query("น\u0e49\u0e4d\u0e32") == "น\u0e49\u0e33",
+                         "Zero-width characters, spaces and split sara am normalized")
+            
+            self.log_test("Registered Thai Form",
+                         query_variants("โพธิ์ จำกัด") == ["โพธิ์ จำกัด", "โพธิ์", "บริษัท โพธิ์ จำกัด"],
+                         "As typed, without affixes, then บริษัท ... จำกัด")
+            
+            self.log_test("Tone Marks",
+                         query_variants("บริษัท ไทยน้ำทิพย์ จำกัด") == ["บริษัท ไทยน้ำทิพย์ จำกัด", "ไทยน้ำทิพย์", "ไทยนำทิพย์"],
+                         "Variant without tone marks, no duplicate registered form")
+            
+            self.log_test("Bare Company Word",
+                         query_variants("บริษัท") == ["บริษัท"] and query_variants("Ltd") == ["Ltd"],
+                         "A name that is only an affix is kept as typed")
+            
+            self.log_test("Max Variants",
+                         query_variants("โพธิ์ จำกัด", max_variants=2) == ["โพธิ์ จำกัด", "โพธิ์"]
+                         and query_variants("โพธิ์ จำกัด", max_variants=0) == ["โพธิ์ จำกัด"]
+                         and query_variants("   ") == [],
+                         "Truncated to max_variants, at least the cleaned name")
+            
+            merged = SearchResult.merge("โพธิ์", [
+                SearchResult(search_term="โพธิ์", hits=(SearchHit("A1", "บริษัท โพธิ์ จำกัด", 80.0), SearchHit("A2", "โพธิ์ทอง", 70.0))),
+                SearchResult(search_term="บริษัท โพธิ์ จำกัด", hits=(SearchHit("A1", "บริษัท โพธิ์ จำกัด", 98.0), SearchHit("A3", "โพธิ์เงิน", 75.0))),
+                SearchResult.failure("โพธ", "Request timed out")
+            ], max_hits=2)
+            self.log_test("Merge Results",
+                         [(hit.account_no, hit.score) for hit in merged.hits] == [("A1", 98.0), ("A3", 75.0)]
+                         and merged.truncated and merged.error is None
+                         and merged.variants == ("บริษัท โพธิ์ จำกัด", "โพธ"),
+                         "De-duplicated by account_no with the best score, sorted and truncated")
+            
+            failed = SearchResult.merge("โพธิ์", [SearchResult.failure("โพธิ์", "Request failed"), SearchResult.failure("โพธ", "Request timed out")])
+            self.log_test("Merge Failures",
+                         failed.error == "Request failed" and not failed.hits,
+                         "Fails only when every variant failed")
+            
+        except Exception as e:
+            self.log_test("Query Normalization", False, str(e))
+    
+    def test_admission_control(self):
+        """Test queueing, shedding and rate limiting of downstream calls"""
+        print("\n🚦 Testing Admission Control...")
+        
+        try:
+            # A call that waits in the queue, on a thread of its own
+            def wait_in_queue(admission, session_id=None):
+                thread = threading.Thread(target=lambda: _raises(OverloadedError, admission.enter, session_id), daemon=True)
+                thread.start()
+                while admission._waiting == 0:
+                    time.sleep(0.01)
+                return thread
+            
+            admission = AdmissionController("test", max_concurrent=1, max_queue=1, queue_timeout=0.5)
+            admission.enter()
+            waiter = wait_in_queue(admission)
+            self.log_test("Queue Full",
+                         _raises(OverloadedError, admission.enter),
+                         "Rejected while the only queue place is taken")
+            admission.leave()
+            waiter.join()
+            self.log_test("Queued Call Admitted",
+                         admission._active == 1 and admission._waiting == 0,
+                         "The waiting call took the released slot")
+            
+            start = time.monotonic()
+            timed_out = _raises(OverloadedError, admission.enter)
+            waited = time.monotonic() - start
+            self.log_test("Queue Timeout",
+                         timed_out and 0.4 <= waited < 2.0 and admission._waiting == 0,
+                         f"Rejected after {waited:.2f}s in the queue")
+            
+            start = time.monotonic()
+            self.log_test("Blocking=False Sheds",
+                         _raises(OverloadedError, admission.enter, blocking=False) and time.monotonic() - start < 0.1,
+                         "Rejected at once when no slot is free")
+            admission.leave()
+            
+            per_session = AdmissionController("test", max_per_session=1, queue_timeout=0.2)
+            session_a = per_session.enter("a")
+            self.log_test("Per-Session Cap",
+                         _raises(OverloadedError, per_session.enter, "a", blocking=False)
+                         and per_session.enter("b", blocking=False) == "b",
+                         "A second call of one session waits while other sessions are admitted")
+            per_session.leave(session_a)
+            self.log_test("Per-Session Release",
+                         per_session.enter("a", blocking=False) == "a" and per_session._per_session == {"a": 1, "b": 1},
+                         "The session's slot is free again after leave()")
+            
+            bucket = TokenBucket(rate=10.0, capacity=2.0)
+            burst = [bucket.acquire() for _ in range(3)]
+            time.sleep(0.12)
+            self.log_test("Token Bucket Refill",
+                         burst == [True, True, False] and bucket.acquire() and not bucket.acquire(),
+                         "Burst up to capacity, then one token per 1/rate seconds")
+            start = time.monotonic()
+            self.log_test("Token Bucket Wait",
+                         bucket.acquire(timeout=0.5) and time.monotonic() - start < 0.4,
+                         "Waits for the next token within the timeout")
+            
+            limited = AdmissionController("test", max_concurrent=1, max_per_session=1, rate=0.5, burst=1.0)
+            with limited.acquire("a"):
+                pass
+            shed_by_bucket = _raises(OverloadedError, limited.enter, "a", blocking=False)
+            self.log_test("Rate Limit Releases Slot",
+                         shed_by_bucket and limited._active == 0 and limited._per_session == {},
+                         "leave() runs when the token bucket rejects an admitted call")
+            
+        except Exception as e:
+            self.log_test("Admission Control", False, str(e))
+    
+    def test_cancellation(self):
+        """Test that cancelling a run stops waiting and cancels the calls it owns"""
+        print("\n🛑 Testing Cancellation...")
+        
+        try:
+            done = Future()
+            done.set_result("report")
+            self.log_test("Wait Returns Result",
+                         CancellationToken().wait(done) == "report" and wait_for(done) == "report",
+                         "Finished futures are returned with or without a token")
+            
+            token = CancellationToken()
+            owned, shared = Future(), Future()
+            threading.Timer(0.2, token.cancel, args=("superseded by new input",)).start()
+            start = time.monotonic()
+            raised = _raises(RunCancelledError, token.wait, owned)
+            self.log_test("Wait Raises When Cancelled",
+                         raised and time.monotonic() - start < 1.0 and token.reason == "superseded by new input",
+                         f"Stopped waiting {time.monotonic() - start:.2f}s after the wait began")
+            self.log_test("Owned Future Cancelled",
+                         owned.cancelled(),
+                         "The awaited call is cancelled with the run")
+            
+            self.log_test("Shared Future Kept",
+                         _raises(RunCancelledError, token.wait, shared, owned=False) and not shared.cancelled(),
+                         "owned=False futures (e.g. prefetches) keep running")
+            
+            # Every spelling of a cancelled search is cancelled, not just the awaited one
+            started, cancelled = [], []
+            
+            async def stall(request):
+                started.append(request.url.params["quote"])
+                try:
+                    await asyncio.sleep(10)
+                except asyncio.CancelledError:
+                    cancelled.append(request.url.params["quote"])
+                    raise
+                return httpx.Response(200, json=[])
+            
+            client = CreditScoreAPIClient(transport=httpx.MockTransport(stall))
+            token = CancellationToken()
+            context_token = current_cancel_token.set(token)
+            try:
+                threading.Timer(0.3, token.cancel).start()
+                search_cancelled = _raises(RunCancelledError, client.search, "โพธิ์ จำกัด")
+            finally:
+                current_cancel_token.reset(context_token)
+            time.sleep(0.2)
+            self.log_test("Search Variants Cancelled",
+                         search_cancelled and len(started) > 1 and sorted(cancelled) == sorted(started),
+                         f"{len(cancelled)} of {len(started)} spelling requests cancelled")
+            
+        except Exception as e:
+            self.log_test("Cancellation", False, str(e))
+    
     def test_ai_chain_initialization(self):
         """Test AI chain initialization"""
         print("\n🤖 Testing AI Chain Initialization...")
@@ -195,6 +442,10 @@ class IntegrationTest:
                          chain.agent_executor is not None, 
                          "Agent executor created")
             
+            self.log_test("Model Routing", 
+                         (chain.fast_llm is not None) == bool(Config.OPENAI_FAST_MODEL and Config.OPENAI_FAST_MODEL != Config.OPENAI_MODEL), 
+                         f"Fast tier: {Config.OPENAI_FAST_MODEL or 'disabled'}")
+            
         except Exception as e:
             self.log_test("AI Chain Initialization", False, str(e))
     
@@ -277,6 +528,10 @@ class IntegrationTest:
         self.test_api_client()
         self.test_tools_initialization()
         self.test_tools_execution()
+        self.test_streaming_parser()
+        self.test_query_normalization()
+        self.test_admission_control()
+        self.test_cancellation()
         self.test_ai_chain_initialization()
         self.test_ai_chain_processing()
         self.test_complete_flow()
@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+"""
+Replay Test for Credit Score Chatbot Performance
+Replays recorded conversations (cassettes) through CreditScoreChain, the tools and
+the API client with the network stubbed out, measures the CPU time of our own code
+per turn and on the parsing/formatting hot paths, and fails when a measurement
+regresses past the stored baseline.
+
+Usage:
+  python test_replay.py                        # replay cassettes/*.json, compare with baseline
+  python test_replay.py --update-baseline      # store the current measurements as the baseline
+  python test_replay.py --record cassettes/name.json "message 1" "select:A123" "message 2"
+                                               # record a live session (needs OpenAI and the backend);
+                                               # "select:<account_no>" clicks a company choice
+
+Measurements are compared relative to a reference workload timed right before each
+one, which evens out CPU speed differences between runs and machines; baselines from
+a different Python version should still be regenerated.
+"""
+
+import argparse
+import asyncio
+import glob
+import json
+import os
+import statistics
+import sys
+import time
+from dataclasses import fields, replace
+from datetime import datetime
+
+# Add current directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import httpx
+from config import Config, PerformanceProfile
+from ai.chain import CreditScoreChain, reset_chat_models
+from ai.tools import SearchCustomerTool, GetCreditScoreTool, set_api_client
+from api.client import CreditScoreAPIClient
+from api.models import SearchResult, CreditReport
+from api.streaming import read_json_array
+from replay import BACKEND, OPENAI, Cassette, RecordingTransport, ReplayTransport
+
+CASSETTE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cassettes")
+BASELINE_PATH = os.path.join(CASSETTE_DIR, "baseline.json")
+
+# Settings that change which requests a conversation makes; stored with each cassette
+RECORDED_SETTINGS = ("OPENAI_MODEL", "OPENAI_FAST_MODEL", "SEARCH_TOP_K", "SEARCH_LIMIT_PARAM")
+
+def apply_settings(settings: dict):
+    """Apply recorded settings, through the performance profile where they belong to it"""
+    profile_fields = {field.name for field in fields(PerformanceProfile)}
+    overrides = {name.lower(): value for name, value in settings.items() if name.lower() in profile_fields}
+    Config.apply_profile(replace(Config.PERF_PROFILE, **overrides))
+    for name, value in settings.items():
+        if name.lower() not in profile_fields:
+            setattr(Config, name, value)
+
+def use_transports(backend_transport: httpx.AsyncBaseTransport, openai_transport: httpx.AsyncBaseTransport):
+    """Route the shared API client and chat models through the given transports"""
+    set_api_client(CreditScoreAPIClient(transport=backend_transport))
+    reset_chat_models(http_async_client=httpx.AsyncClient(transport=openai_transport), max_retries=0)
+
+def run_turn(chain: CreditScoreChain, turn: dict) -> dict:
+    """
+    Run one turn: a user message ({"input": ...}) or a click on a company choice
+    ({"select": account_no}); returns its output and the choices offered afterwards
+    """
+    if "select" in turn:
+        output = chain.select_company(turn["select"])
+    else:
+        output = chain.process_message(turn["input"])
+    return {"output": output, "choices": [hit.account_no for hit in chain.get_company_choices()]}
+
+def record_conversation(cassette: Cassette, backend_transport: httpx.AsyncBaseTransport,
+                        openai_transport: httpx.AsyncBaseTransport, messages: list):
+    """Run a conversation through recording transports; "select:<account_no>" messages pick a choice"""
+    use_transports(
+        RecordingTransport(cassette, BACKEND, backend_transport),
+        RecordingTransport(cassette, OPENAI, openai_transport)
+    )
+    chain = CreditScoreChain()
+    for message in messages:
+        if message.startswith("select:"):
+            turn = {"select": message[len("select:"):]}
+        else:
+            turn = {"input": message}
+        turn.update(run_turn(chain, turn))
+        cassette.turns.append(turn)
+        print(f"> {message}\n{turn['output']}\nchoices: {turn['choices']}\n")
+
+def record(path: str, messages: list):
+    """Run a live conversation and save its exchanges to a cassette"""
+    cassette = Cassette(settings={name: getattr(Config, name) for name in RECORDED_SETTINGS})
+    record_conversation(
+        cassette,
+        httpx.AsyncHTTPTransport(limits=httpx.Limits(max_connections=Config.BACKEND_POOL_SIZE)),
+        httpx.AsyncHTTPTransport(),
+        messages
+    )
+    cassette.save(path)
+    print(f"Recorded {len(cassette.interactions)} exchanges in {len(messages)} turns to {path}")
+
+class ReplayTest:
+    """Replays cassettes and compares CPU time per turn and per hot path with a baseline"""
+
+    def __init__(self, repeat: int = 5, tolerance: float = 0.5):
+        self.repeat = repeat
+        self.tolerance = tolerance
+        self.measurements = {}
+        self.failures = []
+        self._reference_data = [
+            {"account_no": f"A{i}", "varname": f"บริษัท ทดสอบ {i} จำกัด", "score": i} for i in range(200)
+        ]
+
+    def reference_ms(self) -> float:
+        """
+        CPU time of a fixed reference workload (JSON round trip and formatting), best of 3
+
+        Every measurement is divided by a reference timed right before it, so results
+        are in "reference units" that hold across machines and CPU speed changes.
+        """
+        timings = []
+        for _ in range(3):
+            start = time.process_time()
+            for _ in range(5):
+                hits = json.loads(json.dumps(self._reference_data, ensure_ascii=False))
+                "\n".join(f"{hit['varname']} (Account: {hit['account_no']}) - Match Score: {hit['score']}%" for hit in hits)
+            timings.append((time.process_time() - start) * 1000)
+        return max(min(timings), 1e-3)
+
+    def replay_cassette(self, name: str, cassette: Cassette):
+        """Replay one cassette `repeat` times (after a discarded warm-up run) and keep the median per turn"""
+        print(f"\n▶️  Replaying {name} ({cassette.source}, {len(cassette.turns)} turns, {len(cassette.interactions)} exchanges)...")
+        if cassette.note:
+            print(f"  {cassette.note}")
+        apply_settings(cassette.settings)
+
+        cpu_ms = [[] for _ in cassette.turns]
+        wall_ms = [[] for _ in cassette.turns]
+        relative = [[] for _ in cassette.turns]
+        for run in range(self.repeat + 1):
+            backend = ReplayTransport(cassette, BACKEND)
+            openai = ReplayTransport(cassette, OPENAI)
+            use_transports(backend, openai)
+            chain = CreditScoreChain()
+
+            for i, turn in enumerate(cassette.turns):
+                reference = self.reference_ms()
+                cpu_start = time.process_time()
+                wall_start = time.perf_counter()
+                result = run_turn(chain, turn)
+                if run:
+                    cpu_ms[i].append((time.process_time() - cpu_start) * 1000)
+                    wall_ms[i].append((time.perf_counter() - wall_start) * 1000)
+                    relative[i].append(cpu_ms[i][-1] / reference)
+                if run == 0 and result["output"] != turn["output"]:
+                    self.failures.append(f"{name} turn {i + 1}: output differs from the recording")
+                if run == 0 and result["choices"] != turn.get("choices", []):
+                    self.failures.append(
+                        f"{name} turn {i + 1}: offered choices {result['choices']} instead of {turn.get('choices', [])}"
+                    )
+
+            errors = backend.errors + openai.errors
+            if errors or backend.unused() or openai.unused():
+                self.failures.append(
+                    f"{name}: replay diverged from the recording "
+                    f"({len(errors)} unmatched requests, {backend.unused() + openai.unused()} unused exchanges)"
+                )
+                for error in errors[:5]:
+                    print(f"  {error}")
+                return
+
+        recorded_network_ms = sum(
+            interaction["response"].get("elapsed_ms", 0) for interaction in cassette.interactions
+        )
+        for i, turn in enumerate(cassette.turns):
+            cpu = statistics.median(cpu_ms[i])
+            wall = statistics.median(wall_ms[i])
+            self.measurements[f"{name}/turn{i + 1}"] = statistics.median(relative[i])
+            label = f"select {turn['select']}" if "select" in turn else turn["input"][:40]
+            print(f"  Turn {i + 1}: CPU {cpu:.1f}ms, wall {wall:.1f}ms ({label})")
+        if cassette.source == "recorded":
+            print(f"  Recorded network time for the whole conversation: {recorded_network_ms:.0f}ms")
+
+    def measure_hot_paths(self, cassettes: list):
+        """Time parsing and formatting of every recorded backend body, in microseconds per call"""
+        print("\n🔥 Measuring hot paths...")
+        search_bodies = [body for cassette in cassettes for body in cassette.bodies(BACKEND, "/search-customer")]
+        report_bodies = [body for cassette in cassettes for body in cassette.bodies(BACKEND, "/query-credit-score")]
+        search_tool = SearchCustomerTool()
+        credit_tool = GetCreditScoreTool()
+
+        async def parse_search(body):
+            async def chunks():
+                yield body
+            results, complete = await read_json_array(chunks(), Config.SEARCH_TOP_K, Config.MAX_RESPONSE_BYTES)
+            return SearchResult.from_json("replay", results, truncated=not complete)
+
+        loop = asyncio.new_event_loop()
+        try:
+            searches = [loop.run_until_complete(parse_search(body)) for body in search_bodies]
+            reports = [CreditReport.from_json(json.loads(body), max_items=Config.MAX_REPORT_ITEMS) for body in report_bodies]
+            hot_paths = {
+                "search.parse": (search_bodies, lambda body: loop.run_until_complete(parse_search(body))),
+                "search.format": (searches, search_tool._format_search_result),
+                "credit_report.parse": (report_bodies, lambda body: CreditReport.from_json(json.loads(body), max_items=Config.MAX_REPORT_ITEMS)),
+                "credit_report.format": (reports, credit_tool._format_credit_score_result)
+            }
+            for name, (inputs, function) in hot_paths.items():
+                if not inputs:
+                    continue
+                timings = []
+                relative = []
+                for _ in range(self.repeat):
+                    reference = self.reference_ms()
+                    start = time.process_time()
+                    for _ in range(200):
+                        for value in inputs:
+                            function(value)
+                    timings.append((time.process_time() - start) / (200 * len(inputs)) * 1e6)
+                    # Reference units per 1000 calls
+                    relative.append(timings[-1] / reference)
+                self.measurements[f"hot_path/{name}"] = min(relative)
+                print(f"  {name}: {min(timings):.1f}µs per call")
+        finally:
+            loop.run_until_complete(loop.shutdown_asyncgens())
+            loop.close()
+
+    def compare(self, baseline: dict):
+        """Fail on measurements slower than baseline * (1 + tolerance), in reference units"""
+        print(f"\n📏 Comparing with baseline in reference units (tolerance {self.tolerance:.0%})...")
+        for name, value in self.measurements.items():
+            expected = baseline.get(name)
+            if expected is None:
+                print(f"  {name}: no baseline")
+                continue
+            change = (value - expected) / expected if expected else 0.0
+            status = "✅" if value <= expected * (1 + self.tolerance) else "❌"
+            print(f"  {status} {name}: {value:.4f} vs {expected:.4f} ({change:+.0%})")
+            if status == "❌":
+                self.failures.append(f"{name} regressed {change:+.0%} ({value:.4f} vs baseline {expected:.4f})")
+
+def main():
+    """Main test runner"""
+    parser = argparse.ArgumentParser(description="Replay recorded conversations and check for performance regressions")
+    parser.add_argument("--record", metavar="CASSETTE", help="record a live session to this cassette")
+    parser.add_argument("messages", nargs="*", help="user messages to send when recording")
+    parser.add_argument("--update-baseline", action="store_true", help="store the measurements as the new baseline")
+    parser.add_argument("--repeat", type=int, default=5, help="replays per cassette (the median is used)")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="allowed slowdown as a fraction of the baseline")
+    args = parser.parse_args()
+
+    # Replays must not write to the local score history
+    Config.HISTORY_DB_PATH = ""
+
+    if args.record:
+        if not args.messages:
+            parser.error("--record needs at least one message")
+        record(args.record, args.messages)
+        return
+
+    # The key is never sent anywhere, but ChatOpenAI requires one
+    Config.OPENAI_API_KEY = Config.OPENAI_API_KEY or "sk-replay"
+    # Rate limits protect live services; replayed turns back to back would only queue on them
+    Config.apply_profile(replace(Config.PERF_PROFILE, llm_rate_limit=0.0, backend_rate_limit=0.0))
+
+    paths = sorted(path for path in glob.glob(os.path.join(CASSETTE_DIR, "*.json")) if path != BASELINE_PATH)
+    cassettes = {os.path.splitext(os.path.basename(path))[0]: Cassette.load(path) for path in paths}
+    if not cassettes:
+        print(f"No cassettes found in {CASSETTE_DIR}")
+        sys.exit(1)
+
+    print(f"[{datetime.now().strftime('%H:%M:%S')}] Replaying {len(cassettes)} cassette(s)")
+    test = ReplayTest(repeat=args.repeat, tolerance=args.tolerance)
+    for name, cassette in cassettes.items():
+        test.replay_cassette(name, cassette)
+    test.measure_hot_paths(list(cassettes.values()))
+
+    if args.update_baseline:
+        with open(BASELINE_PATH, "w", encoding="utf-8") as f:
+            json.dump({name: round(value, 4) for name, value in sorted(test.measurements.items())}, f, indent=2)
+            f.write("\n")
+        print(f"\n💾 Baseline written to {BASELINE_PATH}")
+    elif os.path.exists(BASELINE_PATH):
+        with open(BASELINE_PATH, encoding="utf-8") as f:
+            test.compare(json.load(f))
+    else:
+        print("\nNo baseline yet; run with --update-baseline to create one")
+
+    if test.failures:
+        print("\n🔍 Failures:")
+        for failure in test.failures:
+            print(f"  - {failure}")
+        print("\n⚠️  Replay test failed.")
+        sys.exit(1)
+    print("\n🎉 Replay test passed!")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+import json
+import os
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+from config import Config
+
+class Span:
+    """One timed operation within a trace"""
+
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "sampled",
+                 "start_time", "duration_ms", "status", "attributes")
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str], sampled: bool,
+                 attributes: Dict[str, Any]):
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.name = name
+        self.sampled = sampled
+        self.start_time = time.time()
+        self.duration_ms = None
+        self.status = "ok"
+        self.attributes = attributes
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        if self.sampled:
+            self.attributes[key] = value
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start_time": self.start_time,
+            "duration_ms": self.duration_ms,
+            "status": self.status,
+            "attributes": self.attributes
+        }
+
+class RingBufferExporter:
+    """Keeps the most recent finished spans in memory"""
+
+    def __init__(self, max_spans: int = 2000):
+        self._spans = deque(maxlen=max_spans)
+
+    def export(self, span: Dict[str, Any]) -> None:
+        self._spans.append(span)
+
+    def get_spans(self, trace_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        spans = list(self._spans)
+        if trace_id is not None:
+            spans = [span for span in spans if span["trace_id"] == trace_id]
+        return spans
+
+class JsonlFileExporter:
+    """
+    Appends finished spans to a JSON-lines file, one span per line
+
+    The most recent spans are also kept in memory, so reading them back (e.g. for
+    the admin sidebar) does not re-read a file that only ever grows.
+    """
+
+    def __init__(self, path: str, max_recent: int = 2000):
+        self.path = path
+        self._lock = threading.Lock()
+        self._recent = RingBufferExporter(max_recent)
+
+    def export(self, span: Dict[str, Any]) -> None:
+        line = json.dumps(span, ensure_ascii=False, default=str) + "\n"
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line)
+        self._recent.export(span)
+
+    def get_spans(self, trace_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Spans exported by this process, up to the most recent max_recent"""
+        return self._recent.get_spans(trace_id)
+
+# Span the current code runs in; propagated to worker threads and background tasks explicitly
+current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+# Global exporter instance
+_exporter = None
+
+def get_exporter():
+    """Get or create the span exporter configured by TRACE_EXPORTER ("memory", "jsonl" or "none")"""
+    global _exporter
+    if _exporter is None:
+        if Config.TRACE_EXPORTER == "jsonl":
+            _exporter = JsonlFileExporter(Config.TRACE_FILE, Config.TRACE_BUFFER_SIZE)
+        elif Config.TRACE_EXPORTER == "memory":
+            _exporter = RingBufferExporter(Config.TRACE_BUFFER_SIZE)
+    return _exporter
+
+@contextmanager
+def span(name: str, /, **attributes):
+    """
+    Time a block as a span of the current trace, starting a new trace if there is none
+
+    The sampling decision is made once per trace (TRACE_SAMPLE_RATE). Unsampled
+    traces still carry IDs for propagation, but record and export nothing, and
+    their nested spans are no-ops.
+    """
+    parent = current_span.get()
+    if parent is not None and not parent.sampled:
+        yield parent
+        return
+
+    if parent is None:
+        exporter = get_exporter()
+        sampled = exporter is not None and random.random() < Config.TRACE_SAMPLE_RATE
+        new_span = Span(name, os.urandom(16).hex(), None, sampled, attributes if sampled else {})
+    else:
+        new_span = Span(name, parent.trace_id, parent.span_id, True, attributes)
+
+    token = current_span.set(new_span)
+    start = time.perf_counter()
+    try:
+        yield new_span
+    except BaseException as e:
+        new_span.status = "error"
+        new_span.set_attribute("error", f"{type(e).__name__}: {e}"[:200])
+        raise
+    finally:
+        current_span.reset(token)
+        if new_span.sampled:
+            new_span.duration_ms = round((time.perf_counter() - start) * 1000, 3)
+            try:
+                get_exporter().export(new_span.to_dict())
+            except Exception as e:
+                print(f"Error exporting span: {e}")
+
+def propagation_headers() -> Dict[str, str]:
+    """W3C traceparent header for the current span, to send with outgoing requests"""
+    active = current_span.get()
+    if active is None:
+        return {}
+    return {"traceparent": f"00-{active.trace_id}-{active.span_id}-{'01' if active.sampled else '00'}"}
+
+def get_trace_id() -> Optional[str]:
+    active = current_span.get()
+    return active.trace_id if active is not None else None
@@ -0,0 +1,168 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict
+from config import Config
+from metrics import metrics
+
+# Warm-up progress, reported by the readiness endpoint
+_state: Dict[str, Any] = {
+    "status": "cold",  # cold -> warming -> ready (or failed)
+    "started_at": None,
+    "finished_at": None,
+    "steps": {}
+}
+_state_lock = threading.Lock()
+_warmup_thread = None
+_readiness_server = None
+
+def _record_step(name: str, start: float, detail: Any = None, error: Exception = None):
+    step = {"ms": round((time.perf_counter() - start) * 1000, 1)}
+    if detail is not None:
+        step["detail"] = detail
+    if error is not None:
+        step["error"] = str(error)
+    with _state_lock:
+        _state["steps"][name] = step
+    metrics.observe(f"warmup.{name}_ms", step["ms"])
+
+def warm_up() -> bool:
+    """
+    Build the shared, process-wide resources before the first user needs them
+
+    Imports the LangChain stack, creates the shared chat model clients, compiles the
+    agent prompt and tool schemas, opens pooled backend connections and optionally
+    preloads the result cache. Steps that depend on external services are best
+    effort: their failure is recorded but does not keep the replica from being ready.
+
+    Returns:
+        True once the replica is ready
+    """
+    with _state_lock:
+        _state["status"] = "warming"
+        _state["started_at"] = time.time()
+
+    try:
+        start = time.perf_counter()
+        from ai.chain import get_chat_model
+        from ai.prompts import get_agent_prompt, get_openai_tools
+        from ai.tools import SearchCustomerTool, GetCreditScoreTool, get_api_client
+        from ai.interpretation import get_catalog
+        from api.history import get_history_store
+        from admission import get_backend_admission, get_llm_admission
+        from background import get_background_loop
+        _record_step("imports", start)
+
+        start = time.perf_counter()
+        get_chat_model("large")
+        get_chat_model("fast")
+        get_agent_prompt()
+        get_openai_tools([SearchCustomerTool(), GetCreditScoreTool()])
+        get_catalog()
+        get_history_store()
+        get_backend_admission()
+        get_llm_admission()
+        get_background_loop()
+        api_client = get_api_client()
+        _record_step("shared_resources", start)
+    except Exception as e:
+        with _state_lock:
+            _state["status"] = "failed"
+            _state["finished_at"] = time.time()
+            _state["steps"]["shared_resources"] = {"error": str(e)}
+        print(f"Warm-up failed: {e}")
+        return False
+
+    start = time.perf_counter()
+    try:
+        opened = api_client.run(api_client.warm_connections(Config.WARMUP_CONNECTIONS))
+        _record_step("backend_connections", start, detail=opened)
+    except Exception as e:
+        _record_step("backend_connections", start, error=e)
+
+    if Config.WARMUP_OPENAI:
+        # Listing models is free and opens the TLS connection the chat calls reuse
+        start = time.perf_counter()
+        try:
+            root_async_client = getattr(get_chat_model("large"), "root_async_client", None)
+            if root_async_client is not None:
+                async def list_models():
+                    return await root_async_client.models.list()
+                get_background_loop().run(list_models())
+            _record_step("openai_connection", start)
+        except Exception as e:
+            _record_step("openai_connection", start, error=e)
+
+    if Config.WARMUP_COMPANIES or Config.WARMUP_ACCOUNTS:
+        start = time.perf_counter()
+        preloaded = 0
+        try:
+            accounts = list(Config.WARMUP_ACCOUNTS)
+            for name in Config.WARMUP_COMPANIES:
+                result = api_client.search(name)
+                if result.hits:
+                    accounts.append(max(result.hits, key=lambda hit: hit.score or 0).account_no)
+            for account_no in dict.fromkeys(accounts):
+                if api_client.fetch_credit_score(account_no).error is None:
+                    preloaded += 1
+            _record_step("cache_preload", start, detail=preloaded)
+        except Exception as e:
+            _record_step("cache_preload", start, error=e)
+
+    with _state_lock:
+        _state["status"] = "ready"
+        _state["finished_at"] = time.time()
+    print(f"Warm-up finished in {(_state['finished_at'] - _state['started_at']):.1f}s")
+    return True
+
+def get_warmup_state() -> Dict[str, Any]:
+    """Get a copy of the warm-up progress"""
+    with _state_lock:
+        return json.loads(json.dumps(_state))
+
+class _ReadinessHandler(BaseHTTPRequestHandler):
+    """/ready answers 200 once warm-up has finished (503 before); /live always answers 200"""
+
+    def do_GET(self):
+        if self.path.startswith("/live"):
+            self._send(200, {"status": "alive"})
+        elif self.path.startswith("/ready"):
+            state = get_warmup_state()
+            self._send(200 if state["status"] == "ready" else 503, state)
+        else:
+            self._send(404, {"error": "not found"})
+
+    def _send(self, status: int, body: Dict[str, Any]):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_readiness_server(port: int = None):
+    """Serve /ready and /live on a background thread (once per process)"""
+    global _readiness_server
+    port = Config.READINESS_PORT if port is None else port
+    if _readiness_server is not None or not port:
+        return
+    try:
+        _readiness_server = ThreadingHTTPServer(("0.0.0.0", port), _ReadinessHandler)
+    except OSError as e:
+        print(f"Readiness server not started on port {port}: {e}")
+        return
+    threading.Thread(target=_readiness_server.serve_forever, name="readiness-server", daemon=True).start()
+
+def start_warmup():
+    """Start the readiness server and warm-up in the background (once per process)"""
+    global _warmup_thread
+    with _state_lock:
+        if _warmup_thread is not None:
+            return
+        _warmup_thread = threading.Thread(target=warm_up, name="warmup", daemon=True)
+    start_readiness_server()
+    _warmup_thread.start()